@@ -10,7 +10,12 @@ import os
 import logging
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+
+# Lookup table of characters allowed in environment variable names
+KEYCHAR = bytes(1 if chr(i).isalnum() or chr(i) in '._-' else 0 for i in range(256))
+
+# Whether the .env file has already been loaded in this process
+_loaded = False
 
 def load_env_file(env_file='.env'):
     """
@@ -27,31 +32,59 @@ def load_env_file(env_file='.env'):
             logger.warning(f"Environment file {env_file} not found")
             return False
             
-        logger.info(f"Loading environment variables from {env_file}")
-        with open(env_file, 'r') as f:
-            for line in f:
-                line = line.strip()
-                
-                # Skip empty lines and comments
-                if not line or line.startswith('#'):
-                    continue
-                    
-                # Parse key-value pairs
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    key = key.strip()
-                    value = value.strip()
-                    
-                    # Remove quotes if present
-                    if value.startswith('"') and value.endswith('"'):
-                        value = value[1:-1]
-                    elif value.startswith("'") and value.endswith("'"):
-                        value = value[1:-1]
-                    
-                    # Set environment variable if not already set
-                    if key and value and key not in os.environ:
-                        os.environ[key] = value
-                        logger.debug(f"Set environment variable: {key}")
+        logger.info("Loading environment variables from %s", env_file)
+        # Read the whole file at once; universal newlines normalize line endings
+        with open(env_file, 'r', encoding='utf-8', errors='replace') as f:
+            data = f.read()
+        
+        i = 0
+        end = len(data)
+        while i < end:
+            # Skip leading whitespace (including blank lines)
+            while i < end and data[i] in ' \t\n':
+                i += 1
+            if i >= end:
+                break
+            
+            line_end = data.find('\n', i)
+            if line_end == -1:
+                line_end = end
+            
+            # Skip comments
+            if data[i] == '#':
+                i = line_end + 1
+                continue
+            
+            # Scan the key
+            key_start = i
+            while i < line_end and ord(data[i]) < 256 and KEYCHAR[ord(data[i])]:
+                i += 1
+            key = data[key_start:i]
+            
+            # Allow whitespace between the key and '='
+            while i < line_end and data[i] in ' \t':
+                i += 1
+            if not key or i >= line_end or data[i] != '=':
+                i = line_end + 1
+                continue
+            
+            # Parse the value, removing quotes if present
+            value_start = i + 1
+            value_end = line_end
+            while value_start < value_end and data[value_start] in ' \t':
+                value_start += 1
+            while value_end > value_start and data[value_end - 1] in ' \t':
+                value_end -= 1
+            if value_end - value_start >= 2 and data[value_start] in '"\'' and data[value_end - 1] == data[value_start]:
+                value_start += 1
+                value_end -= 1
+            value = data[value_start:value_end]
+            i = line_end + 1
+            
+            # Set environment variable if not already set
+            if value and key not in os.environ:
+                os.environ[key] = value
+                logger.debug("Set environment variable: %s", key)
         
         return True
         
@@ -69,11 +102,8 @@ def check_required_env_vars(required_vars):
     Returns:
         bool: True if all required variables are set, False otherwise
     """
-    missing_vars = []
-    
-    for var in required_vars:
-        if var not in os.environ or not os.environ[var]:
-            missing_vars.append(var)
+    env = os.environ
+    missing_vars = [var for var in required_vars if not env.get(var)]
     
     if missing_vars:
         logger.warning(f"Missing required environment variables: {', '.join(missing_vars)}")
@@ -81,6 +111,13 @@ def check_required_env_vars(required_vars):
     
     return True
 
+def load_env_once():
+    """Load the .env file into the environment, only the first time it is called."""
+    global _loaded
+    if not _loaded:
+        load_env_file()
+        _loaded = True
+
 def init_env():
     """
     Initialize environment variables by loading from .env file
@@ -89,8 +126,8 @@ def init_env():
     Returns:
         bool: True if initialization was successful, False otherwise
     """
-    # Load from .env file if it exists
-    load_env_file()
+    # Load from .env file if it exists (only once per process)
+    load_env_once()
     
     # Check required environment variables
     required_vars = ['TELEGRAM_BOT_TOKEN', 'RAIL_TOKEN']
@@ -98,10 +135,8 @@ def init_env():
 
 if __name__ == "__main__":
     # Configure logging
-    logging.basicConfig(
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        level=logging.INFO
-    )
+    from src.train_bot.logging_setup import configure_logging
+    configure_logging()
     
     # Test the module
     if init_env():
@@ -4,7 +4,20 @@
 import asyncio
 import signal
 import sys
+
+# Faster libuv-based event loop, where available
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+from src.train_bot.logging_setup import configure_logging
 from src.train_bot.bot import main
+from src.train_bot.database.operations import close_pool
+from src.train_bot.database.write_queue import stop_status_writer
+
+# Enable logging
+configure_logging()
 
 # Global variable to hold the application instance
 application = None
@@ -24,8 +37,9 @@ async def shutdown():
     if application:
         # First check if updater is running before stopping it
         try:
-            if hasattr(application, 'updater') and application.updater.running:
-                await application.updater.stop()
+            updater = getattr(application, 'updater', None)
+            if updater is not None and updater.running:
+                await updater.stop()
                 print("Updater stopped")
         except Exception as e:
             print(f"Error stopping updater: {e}")
@@ -44,6 +58,13 @@ async def shutdown():
         except Exception as e:
             print(f"Error during shutdown: {e}")
     
+    # Write any queued statuses, then close the shared database connection
+    try:
+        await stop_status_writer()
+        await close_pool()
+    except Exception as e:
+        print(f"Error closing database connection: {e}")
+    
     # Signal the main task to end
     print("Bot shutdown completed")
     
@@ -55,10 +76,9 @@ async def run_bot():
     stop_event = asyncio.Event()
     
     # Set up signal handlers for graceful shutdown
-    for s in [signal.SIGINT, signal.SIGTERM]:
-        asyncio.get_event_loop().add_signal_handler(
-            s, lambda: asyncio.create_task(handle_signal(stop_event))
-        )
+    loop = asyncio.get_running_loop()
+    for s in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(s, handle_signal, stop_event)
     
     # Start the bot
     try:
@@ -71,12 +91,14 @@ async def run_bot():
         # Make sure to call shutdown if we exit the try block
         await shutdown()
 
-async def handle_signal(stop_event):
-    """Handle termination signals."""
+def handle_signal(stop_event):
+    """Handle termination signals (runs directly as the loop's signal callback)."""
     print("Received termination signal!")
     stop_event.set()  # Signal the main task to stop
 
 if __name__ == "__main__":
+    if uvloop is not None:
+        uvloop.install()
     try:
         asyncio.run(run_bot())
     except KeyboardInterrupt:
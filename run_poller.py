@@ -29,33 +29,82 @@ import json
 import aiosqlite
 from datetime import datetime
 
-import train_bot.subscription_poller as subscription_poller
+from src.train_bot.logging_setup import configure_logging
+
+# Enable logging before importing the poller, which logs at import time
+configure_logging()
+
+import src.train_bot.subscription_poller as subscription_poller
+from src.train_bot.database.models import apply_pragmas
+from src.train_bot.utils.date_utils import WEEKDAYS
 from load_env import init_env
 
-# Enable logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-)
 logger = logging.getLogger("poller")
-logger.setLevel(logging.DEBUG)
 
+# Station ID -> English name index for log messages
+_STATION_NAME_BY_ID = {station["id"]: station["english"] for station in subscription_poller.TRAIN_STATIONS}
+
+
+# Status used to force a status change in test mode
+_FORCED_STATUS = json.dumps({"status": "unknown", "delay_minutes": 0})
+
+# Shared database connection, opened on first use
+_conn = None
+
+# Subscription with the user's notification settings
+TEST_SUBSCRIPTION_QUERY = """
+SELECT 
+    s.subscription_id, s.user_id, u.telegram_id, 
+    s.departure_station, s.arrival_station, 
+    s.day_of_week, s.departure_time, s.last_status,
+    u.notification_before_departure, u.notification_delay_threshold,
+    u.notifications_paused
+FROM subscriptions s
+JOIN users u ON s.user_id = u.user_id
+WHERE s.subscription_id = ?
+"""
+
+
+async def get_connection():
+    """Get the shared database connection, opening it on first use."""
+    global _conn
+    if _conn is None:
+        _conn = await aiosqlite.connect(subscription_poller.DB_PATH)
+        await apply_pragmas(_conn)
+    return _conn
+
+
+async def close_connection():
+    """Close the shared database connection if it is open."""
+    global _conn
+    if _conn is not None:
+        await _conn.close()
+        _conn = None
 
 
 async def run_daemon(interval):
     """Run the poller as a daemon process with the specified interval."""
     logger.info(f"Starting poller daemon with {interval} second interval")
     
+    loop = asyncio.get_running_loop()
+    # Absolute time of the next poll, so the cadence does not drift
+    deadline = loop.time()
+    
     try:
         while True:
-            start_time = datetime.now()
-            logger.info(f"Running poll at {start_time}")
+            start = loop.time()
+            deadline += interval
+            logger.info(f"Running poll at {datetime.now()}")
             
             # Run the poller
             await subscription_poller.main()
             
-            # Calculate how long to sleep
-            elapsed = (datetime.now() - start_time).total_seconds()
-            sleep_time = max(0, interval - elapsed)
+            # Sleep until the next deadline; skip missed ticks after a slow poll
+            now = loop.time()
+            elapsed = now - start
+            if deadline < now:
+                deadline = now
+            sleep_time = deadline - now
             
             logger.info(f"Poll completed in {elapsed:.2f} seconds. Sleeping for {sleep_time:.2f} seconds.")
             await asyncio.sleep(sleep_time)
@@ -84,81 +133,72 @@ async def run_test_notification(subscription_id):
     logger.info(f"Running test notification for subscription ID {subscription_id}")
     
     try:
-        # Connect to database
-        async with aiosqlite.connect(subscription_poller.DB_PATH) as conn:
-            # Get the subscription with user info
-            async with conn.execute("""
-            SELECT 
-                s.subscription_id, s.user_id, u.telegram_id, 
-                s.departure_station, s.arrival_station, 
-                s.day_of_week, s.departure_time, s.last_status,
-                u.notification_before_departure, u.notification_delay_threshold,
-                u.notifications_paused
-            FROM subscriptions s
-            JOIN users u ON s.user_id = u.user_id
-            WHERE s.subscription_id = ?
-            """, (subscription_id,)) as cursor:
-                subscription = await cursor.fetchone()
-                
-                if not subscription:
-                    logger.error(f"Subscription ID {subscription_id} not found")
-                    sys.exit(1)
-                
-                (
-                    subscription_id, user_id, telegram_id, 
-                    departure_station, arrival_station, 
-                    day_of_week, departure_time, last_status,
-                    notification_before_departure, notification_delay_threshold,
-                    notifications_paused
-                ) = subscription
-                
-                # Log detailed subscription information
-                from src.train_bot.utils.date_utils import WEEKDAYS
-                
-                # Get station names for logging
-                def get_station_name(station_id):
-                    for station in subscription_poller.TRAIN_STATIONS:
-                        if station["id"] == station_id:
-                            return station["english"]
-                    return "Unknown Station"
-                
-                logger.debug(f"Subscription {subscription_id} details:")
-                logger.debug(f"  User ID: {user_id}, Telegram ID: {telegram_id}")
-                logger.debug(f"  Route: {get_station_name(departure_station)} → {get_station_name(arrival_station)}")
-                logger.debug(f"  Day of week: {day_of_week} ({WEEKDAYS(day_of_week).name})")
-                logger.debug(f"  Departure time: {departure_time}")
-                logger.debug(f"  Notification settings: {notification_before_departure} min before, {notification_delay_threshold} min threshold")
-                logger.debug(f"  Notifications paused: {notifications_paused}")
-                
-                # Check for paused notifications
-                if notifications_paused:
-                    logger.warning(f"Notifications are paused for subscription ID {subscription_id}. Test notification will not be sent.")
-                    logger.info("To test notifications, unpause notifications for this user first.")
-                    return
-                
-                # Force notification by setting last_status to trigger a status change
-                forced_status = json.dumps({"status": "unknown", "delay_minutes": 0})
-                logger.debug("TEST MODE: Setting forced_status to trigger notification")
-                
-                # Set a large hours_before_departure value to bypass time check
-                hours_before_departure = 48
-                logger.debug(f"TEST MODE: Using hours_before_departure={hours_before_departure} to bypass time check")
-                
-                # Call check_subscription but don't update the database
-                _, notifications_sent = await subscription_poller.check_subscription(
-                    subscription_id, user_id, telegram_id, 
-                    departure_station, arrival_station, 
-                    day_of_week, departure_time, forced_status,
-                    notification_before_departure, notification_delay_threshold,
-                    hours_before_departure=hours_before_departure
-                )
-                
-                if notifications_sent > 0:
-                    logger.info(f"Test notification sent successfully for subscription ID {subscription_id}")
-                else:
-                    logger.warning(f"No notification sent for subscription ID {subscription_id}")
-                    logger.debug(f"TEST MODE: No notification sent - see logs above for detailed reasons")
-    
+        # Get the subscription with user info
+        conn = await get_connection()
+        async with conn.execute(TEST_SUBSCRIPTION_QUERY, (subscription_id,)) as cursor:
+            subscription = await cursor.fetchone()
+        
+        if not subscription:
+            logger.error(f"Subscription ID {subscription_id} not found")
+            sys.exit(1)
+        
+        (
+            subscription_id, user_id, telegram_id, 
+            departure_station, arrival_station, 
+            day_of_week, departure_time, last_status,
+            notification_before_departure, notification_delay_threshold,
+            notifications_paused
+        ) = subscription
+        
+        # Log detailed subscription information
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Subscription %s details:\n"
+                "  User ID: %s, Telegram ID: %s\n"
+                "  Route: %s → %s\n"
+                "  Day of week: %s (%s)\n"
+                "  Departure time: %s\n"
+                "  Notification settings: %s min before, %s min threshold\n"
+                "  Notifications paused: %s",
+                subscription_id,
+                user_id, telegram_id,
+                _STATION_NAME_BY_ID.get(departure_station, "Unknown Station"),
+                _STATION_NAME_BY_ID.get(arrival_station, "Unknown Station"),
+                day_of_week, WEEKDAYS(day_of_week).name,
+                departure_time,
+                notification_before_departure, notification_delay_threshold,
+                notifications_paused
+            )
+        
+        # Check for paused notifications
+        if notifications_paused:
+            logger.warning(f"Notifications are paused for subscription ID {subscription_id}. Test notification will not be sent.")
+            logger.info("To test notifications, unpause notifications for this user first.")
+            return
+        
+        # Force notification by setting last_status to trigger a status change
+        forced_status = _FORCED_STATUS
+        logger.debug("TEST MODE: Setting forced_status to trigger notification")
+        
+        # Set a large hours_before_departure value to bypass time check
+        hours_before_departure = 48
+        logger.debug(f"TEST MODE: Using hours_before_departure={hours_before_departure} to bypass time check")
+        
+        # Call check_subscription but don't update the database
+        _, notifications_sent = await subscription_poller.check_subscription(
+            subscription_id, user_id, telegram_id, 
+            departure_station, arrival_station, 
+            day_of_week, departure_time, forced_status,
+            notification_before_departure, notification_delay_threshold,
+            hours_before_departure=hours_before_departure
+        )
+        
+        if notifications_sent > 0:
+            logger.info(f"Test notification sent successfully for subscription ID {subscription_id}")
+        else:
+            logger.warning(f"No notification sent for subscription ID {subscription_id}")
+            logger.debug(f"TEST MODE: No notification sent - see logs above for detailed reasons")
+        
     except Exception as e:
         logger.exception(f"Error in test notification: {e}")
         sys.exit(1)
@@ -206,15 +246,18 @@ async def main():
         sys.exit(1)
     
     # Run in the appropriate mode
-    if args.daemon:
-        logger.info("Running daemon")
-        await run_daemon(args.interval)
-    elif args.test_notification is not None:
-        logger.info(f"Testing notification for subscription {args.test_notification}")
-        await run_test_notification(args.test_notification)
-    else:  # args.once
-        logger.info("Running once")
-        await run_once()
+    try:
+        if args.daemon:
+            logger.info("Running daemon")
+            await run_daemon(args.interval)
+        elif args.test_notification is not None:
+            logger.info(f"Testing notification for subscription {args.test_notification}")
+            await run_test_notification(args.test_notification)
+        else:  # args.once
+            logger.info("Running once")
+            await run_once()
+    finally:
+        await close_connection()
 
 
 if __name__ == "__main__":
@@ -10,8 +10,13 @@ setup(
         "python-telegram-bot>=20.0",
         "python-dotenv>=0.19.0",
         "requests>=2.26.0",
+        "aiohttp>=3.8.0",
+        "pytz>=2021.3",
+        "aiosqlite>=0.19.0",
+        "cachetools>=5.0.0",
+        'uvloop>=0.17.0; sys_platform != "win32"',
     ],
-    python_requires=">=3.7",
+    python_requires=">=3.9",
     entry_points={
         "console_scripts": [
             "train-bot=run:main",
@@ -2,6 +2,7 @@
 
 import logging
 import os
+import re
 import sys
 
 from telegram import Update
@@ -14,61 +15,37 @@ from telegram.ext import (
 
 from .database.models import setup_database
 from .utils.constants import ConversationState, CallbackPrefix
-from .handlers.common import (
-    start_command,
-    help_command,
-    error_handler,
-    cancel,
-    back_to_favorites,
-    back_to_train_list,
-    subscribe_from_status
-)
-from .handlers.menu import (
-    main_menu_command,
-    handle_menu_selection,
-    cancel_callback
-)
-from .handlers.status import (
-    status_command,
-    check_train_status,
-    select_status_departure_station,
-    select_status_arrival_station,
-    show_status_all_stations,
-    handle_status_pagination,
-)
-from .handlers.status_handlers_2 import (
-    select_status_date,
-    get_future_train_status,
-    get_current_train_status,
-    show_train_details,
-    refresh_train_status
-)
-from .handlers.favorites import (
-    favorites_command,
-    handle_favorite_action,
-    add_favorite_station_handler,
-    remove_favorite_station_handler
-)
-from .handlers.notifications import (
-    pause_notifications_command,
-    resume_notifications_command,
-    settings_command,
-    refresh_notification_status
-)
-from .handlers.subscriptions import (
-    subscriptions_command,
-    unsubscribe_command,
-    handle_subscription_selection,
-    handle_subscription_confirmation
-)
 from load_env import init_env
 
-# Enable logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-)
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+
+# Callback query patterns, compiled once and shared between handlers
+CANCEL_PATTERN = re.compile("^cancel$")
+CONFIRM_PATTERN = re.compile("^confirm_(yes|no)$")
+REFRESH_NOTIF_PATTERN = re.compile("^refresh_notif_")
+REFRESH_STATUS_PATTERN = re.compile("^refresh_status_")
+SUBSCRIBE_TRAIN_PATTERN = re.compile("^subscribe_train_")
+SUBSCRIPTION_PATTERN = re.compile("^subscription_")
+STATUS_SHOW_ALL_ARR_PATTERN = re.compile(f"^show_all_{CallbackPrefix.STATUS}_arr$")
+STATUS_SHOW_ALL_DEP_PATTERN = re.compile(f"^show_all_{CallbackPrefix.STATUS}_dep$")
+STATUS_BACK_ARR_PATTERN = re.compile(f"^{CallbackPrefix.BACK}_to_favorites_{CallbackPrefix.STATUS}_arr$")
+STATUS_BACK_DEP_PATTERN = re.compile(f"^{CallbackPrefix.BACK}_to_favorites_{CallbackPrefix.STATUS}_dep$")
+BACK_TO_FAVORITES_PATTERN = re.compile(f"^{CallbackPrefix.BACK}_to_favorites_")
+FAVORITE_ACTION_PATTERN = re.compile(f"^{CallbackPrefix.FAVORITE}_(add|remove|done)$")
+FAVORITE_ADD_PATTERN = re.compile(f"^{CallbackPrefix.FAVORITE}_add_")
+FAVORITE_DONE_PATTERN = re.compile(f"^{CallbackPrefix.FAVORITE}_done$")
+FAVORITE_REMOVE_PATTERN = re.compile(f"^{CallbackPrefix.FAVORITE}_remove_")
+MENU_MAIN_PATTERN = re.compile(f"^{CallbackPrefix.MENU}_main$")
+MENU_PATTERN = re.compile(f"^{CallbackPrefix.MENU}_")
+PAGE_PATTERN = re.compile(f"^{CallbackPrefix.PAGE}_")
+STATUS_ACTION_PATTERN = re.compile(f"^{CallbackPrefix.STATUS}_(future|current)$")
+STATUS_ARR_PATTERN = re.compile(f"^{CallbackPrefix.STATUS}_arr_")
+STATUS_BACK_TO_TIMES_PATTERN = re.compile(f"^{CallbackPrefix.STATUS}_back_to_times$")
+STATUS_DATE_PATTERN = re.compile(f"^{CallbackPrefix.STATUS}_date_")
+STATUS_DEP_PATTERN = re.compile(f"^{CallbackPrefix.STATUS}_dep_")
+STATUS_MANAGE_FAVORITES_PATTERN = re.compile(f"^{CallbackPrefix.STATUS}_manage_favorites$")
+STATUS_PAGE_PATTERN = re.compile(f"^{CallbackPrefix.STATUS}_page_")
+STATUS_TIME_PATTERN = re.compile(f"^{CallbackPrefix.STATUS}_time_")
 
 async def create_application() -> Application:
     """Create and configure the Application instance."""
@@ -79,8 +56,65 @@ async def create_application() -> Application:
         logger.error("You can create a .env file based on .env.template")
         sys.exit(1)
     
+    # Import handlers here so that importing this module stays cheap
+    from .handlers.common import (
+        start_command,
+        help_command,
+        error_handler,
+        cancel,
+        back_to_favorites,
+        back_to_train_list,
+        subscribe_from_status
+    )
+    from .handlers.menu import (
+        main_menu_command,
+        handle_menu_selection,
+        cancel_callback
+    )
+    from .handlers.status import (
+        status_command,
+        check_train_status,
+        select_status_departure_station,
+        select_status_arrival_station,
+        show_status_all_stations,
+        handle_status_pagination,
+    )
+    from .handlers.status_handlers_2 import (
+        select_status_date,
+        get_future_train_status,
+        get_current_train_status,
+        show_train_details,
+        refresh_train_status
+    )
+    from .handlers.favorites import (
+        favorites_command,
+        handle_favorite_action,
+        add_favorite_station_handler,
+        remove_favorite_station_handler
+    )
+    from .handlers.notifications import (
+        pause_notifications_command,
+        resume_notifications_command,
+        settings_command,
+        refresh_notification_status
+    )
+    from .handlers.subscriptions import (
+        subscriptions_command,
+        unsubscribe_command,
+        handle_subscription_selection,
+        handle_subscription_confirmation
+    )
+    
+    # Startup helpers pull in the connection pool and caches, so import them here too
+    from .database.operations import start_wal_checkpoints
+    from .database.write_queue import start_status_writer
+    from .utils.api_cache import warm_train_times_cache
+    
     # Create the database if it doesn't exist
     await setup_database()
+    start_wal_checkpoints()
+    start_status_writer()
+    await warm_train_times_cache()
     
     # Create the Application
     application = Application.builder().token(os.environ["TELEGRAM_BOT_TOKEN"]).build()
@@ -91,98 +125,98 @@ async def create_application() -> Application:
     # Add conversation handlers with CallbackQueryHandler entry points
     # Status conversation - starts when a user clicks a status action button
     status_conv_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(check_train_status, pattern=f"^{CallbackPrefix.STATUS}_(future|current)$")],
+        entry_points=[CallbackQueryHandler(check_train_status, pattern=STATUS_ACTION_PATTERN)],
         allow_reentry=True,  # Allow multiple concurrent conversations
         per_message=True,  # Track callback queries for every message
         states={
             ConversationState.SELECT_ACTION: [
-                CallbackQueryHandler(check_train_status, pattern=f"^{CallbackPrefix.STATUS}_(future|current)$"),
+                CallbackQueryHandler(check_train_status, pattern=STATUS_ACTION_PATTERN),
             ],
             ConversationState.SELECT_DEPARTURE: [
-                CallbackQueryHandler(select_status_arrival_station, pattern=f"^{CallbackPrefix.STATUS}_dep_"),
+                CallbackQueryHandler(select_status_arrival_station, pattern=STATUS_DEP_PATTERN),
                 CallbackQueryHandler(lambda u, c: show_status_all_stations(u, c, f"{CallbackPrefix.STATUS}_dep"), 
-                                   pattern=f"^show_all_{CallbackPrefix.STATUS}_dep$"),
-                CallbackQueryHandler(favorites_command, pattern=f"^{CallbackPrefix.STATUS}_manage_favorites$"),
-                CallbackQueryHandler(handle_status_pagination, pattern=f"^{CallbackPrefix.STATUS}_page_"),
+                                   pattern=STATUS_SHOW_ALL_DEP_PATTERN),
+                CallbackQueryHandler(favorites_command, pattern=STATUS_MANAGE_FAVORITES_PATTERN),
+                CallbackQueryHandler(handle_status_pagination, pattern=STATUS_PAGE_PATTERN),
                 CallbackQueryHandler(lambda u, c: back_to_favorites(u, c, f"{CallbackPrefix.STATUS}_dep"), 
-                                   pattern=f"^{CallbackPrefix.BACK}_to_favorites_{CallbackPrefix.STATUS}_dep$"),
+                                   pattern=STATUS_BACK_DEP_PATTERN),
             ],
             ConversationState.SELECT_ARRIVAL: [
-                CallbackQueryHandler(select_status_date, pattern=f"^{CallbackPrefix.STATUS}_arr_"),
+                CallbackQueryHandler(select_status_date, pattern=STATUS_ARR_PATTERN),
                 CallbackQueryHandler(lambda u, c: show_status_all_stations(u, c, f"{CallbackPrefix.STATUS}_arr"), 
-                                   pattern=f"^show_all_{CallbackPrefix.STATUS}_arr$"),
-                CallbackQueryHandler(favorites_command, pattern=f"^{CallbackPrefix.STATUS}_manage_favorites$"),
-                CallbackQueryHandler(handle_status_pagination, pattern=f"^{CallbackPrefix.STATUS}_page_"),
+                                   pattern=STATUS_SHOW_ALL_ARR_PATTERN),
+                CallbackQueryHandler(favorites_command, pattern=STATUS_MANAGE_FAVORITES_PATTERN),
+                CallbackQueryHandler(handle_status_pagination, pattern=STATUS_PAGE_PATTERN),
                 CallbackQueryHandler(lambda u, c: back_to_favorites(u, c, f"{CallbackPrefix.STATUS}_arr"), 
-                                   pattern=f"^{CallbackPrefix.BACK}_to_favorites_{CallbackPrefix.STATUS}_arr$"),
+                                   pattern=STATUS_BACK_ARR_PATTERN),
             ],
             ConversationState.SELECT_DATE: [
-                CallbackQueryHandler(get_future_train_status, pattern=f"^{CallbackPrefix.STATUS}_date_"),
+                CallbackQueryHandler(get_future_train_status, pattern=STATUS_DATE_PATTERN),
             ],
             ConversationState.SELECT_TIME: [
-                CallbackQueryHandler(show_train_details, pattern=f"^{CallbackPrefix.STATUS}_time_"),
+                CallbackQueryHandler(show_train_details, pattern=STATUS_TIME_PATTERN),
                 CallbackQueryHandler(lambda u, c: back_to_train_list(u, c), 
-                                   pattern=f"^{CallbackPrefix.STATUS}_back_to_times$"),
-                CallbackQueryHandler(refresh_train_status, pattern="^refresh_status_"),
-                CallbackQueryHandler(subscribe_from_status, pattern="^subscribe_train_"),
+                                   pattern=STATUS_BACK_TO_TIMES_PATTERN),
+                CallbackQueryHandler(refresh_train_status, pattern=REFRESH_STATUS_PATTERN),
+                CallbackQueryHandler(subscribe_from_status, pattern=SUBSCRIBE_TRAIN_PATTERN),
             ],
             ConversationState.CONFIRM_SUBSCRIPTION: [
-                CallbackQueryHandler(handle_subscription_confirmation, pattern="^confirm_(yes|no)$"),
+                CallbackQueryHandler(handle_subscription_confirmation, pattern=CONFIRM_PATTERN),
             ],
         },
         fallbacks=[
-            CallbackQueryHandler(cancel_callback, pattern="^cancel$"),
-            CallbackQueryHandler(handle_menu_selection, pattern=f"^{CallbackPrefix.MENU}_main$"),
+            CallbackQueryHandler(cancel_callback, pattern=CANCEL_PATTERN),
+            CallbackQueryHandler(handle_menu_selection, pattern=MENU_MAIN_PATTERN),
         ],
     )
     
     # Add conversation handler for favorites - starts when user interacts with favorites buttons
     favorites_conv_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(handle_favorite_action, pattern=f"^{CallbackPrefix.FAVORITE}_(add|remove|done)$")],
+        entry_points=[CallbackQueryHandler(handle_favorite_action, pattern=FAVORITE_ACTION_PATTERN)],
         allow_reentry=True,
         per_message=True,  # Track callback queries for every message
         states={
             ConversationState.MANAGE_FAVORITES: [
                 CallbackQueryHandler(handle_favorite_action, 
-                                   pattern=f"^{CallbackPrefix.FAVORITE}_(add|remove|done)$"),
+                                   pattern=FAVORITE_ACTION_PATTERN),
             ],
             ConversationState.ADD_FAVORITE: [
-                CallbackQueryHandler(add_favorite_station_handler, pattern=f"^{CallbackPrefix.FAVORITE}_add_"),
-                CallbackQueryHandler(handle_status_pagination, pattern=f"^{CallbackPrefix.PAGE}_"),
+                CallbackQueryHandler(add_favorite_station_handler, pattern=FAVORITE_ADD_PATTERN),
+                CallbackQueryHandler(handle_status_pagination, pattern=PAGE_PATTERN),
                 CallbackQueryHandler(lambda u, c: back_to_favorites(u, c), 
-                                   pattern=f"^{CallbackPrefix.BACK}_to_favorites_"),
+                                   pattern=BACK_TO_FAVORITES_PATTERN),
             ],
             ConversationState.REMOVE_FAVORITE: [
-                CallbackQueryHandler(remove_favorite_station_handler, pattern=f"^{CallbackPrefix.FAVORITE}_remove_"),
-                CallbackQueryHandler(remove_favorite_station_handler, pattern=f"^{CallbackPrefix.FAVORITE}_done$"),
+                CallbackQueryHandler(remove_favorite_station_handler, pattern=FAVORITE_REMOVE_PATTERN),
+                CallbackQueryHandler(remove_favorite_station_handler, pattern=FAVORITE_DONE_PATTERN),
             ],
         },
         fallbacks=[
-            CallbackQueryHandler(cancel_callback, pattern="^cancel$"),
-            CallbackQueryHandler(handle_menu_selection, pattern=f"^{CallbackPrefix.MENU}_main$"),
+            CallbackQueryHandler(cancel_callback, pattern=CANCEL_PATTERN),
+            CallbackQueryHandler(handle_menu_selection, pattern=MENU_MAIN_PATTERN),
         ],
     )
     
     # Add conversation handler for unsubscribe - starts when user selects a subscription
     unsubscribe_conv_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(handle_subscription_selection, pattern="^subscription_")],
+        entry_points=[CallbackQueryHandler(handle_subscription_selection, pattern=SUBSCRIPTION_PATTERN)],
         allow_reentry=True,
         per_message=True,  # Track callback queries for every message
         states={
             ConversationState.SELECT_SUBSCRIPTION: [
-                CallbackQueryHandler(handle_subscription_selection, pattern="^subscription_"),
+                CallbackQueryHandler(handle_subscription_selection, pattern=SUBSCRIPTION_PATTERN),
             ],
         },
         fallbacks=[
-            CallbackQueryHandler(cancel_callback, pattern="^cancel$"),
-            CallbackQueryHandler(handle_menu_selection, pattern=f"^{CallbackPrefix.MENU}_main$"),
+            CallbackQueryHandler(cancel_callback, pattern=CANCEL_PATTERN),
+            CallbackQueryHandler(handle_menu_selection, pattern=MENU_MAIN_PATTERN),
         ],
     )
     
     # Add menu-related handlers first
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("menu", main_menu_command))
-    application.add_handler(CallbackQueryHandler(handle_menu_selection, pattern=f"^{CallbackPrefix.MENU}_"))
+    application.add_handler(CallbackQueryHandler(handle_menu_selection, pattern=MENU_PATTERN))
     
     # Add command handlers that display initial menus
     application.add_handler(CommandHandler("status", status_command))  # Shows status options menu 
@@ -203,7 +237,7 @@ async def create_application() -> Application:
     
     # Add notification refresh handler
     application.add_handler(
-        CallbackQueryHandler(refresh_notification_status, pattern="^refresh_notif_")
+        CallbackQueryHandler(refresh_notification_status, pattern=REFRESH_NOTIF_PATTERN)
     )
     
     return application
@@ -230,4 +264,6 @@ async def main() -> None:
 
 if __name__ == "__main__":
     import asyncio
+    from .logging_setup import configure_logging
+    configure_logging()
     asyncio.run(main())
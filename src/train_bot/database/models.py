@@ -7,68 +7,101 @@ import json
 # Database setup
 DB_PATH = "train_bot.db"
 
-async def setup_database():
-    """Create the database tables if they don't exist."""
-    async with aiosqlite.connect(DB_PATH) as conn:
-        # Create users table
-        await conn.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        user_id INTEGER PRIMARY KEY,
-        telegram_id INTEGER UNIQUE,
-        username TEXT,
-        first_name TEXT,
-        last_name TEXT,
-        language_code TEXT,
-        notification_before_departure INTEGER DEFAULT 15,
-        notification_delay_threshold INTEGER DEFAULT 5,
-        notifications_paused BOOLEAN DEFAULT 0,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
+# Per-connection tuning: WAL journaling, relaxed fsync, waiting on locks and a larger page cache
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA wal_autocheckpoint=200",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA foreign_keys=ON",
+)
+
+async def apply_pragmas(conn: aiosqlite.Connection) -> None:
+    """Apply the tuning PRAGMAs to a freshly opened connection."""
+    for pragma in PRAGMAS:
+        await conn.execute(pragma)
+
+# Database schema, run as a single script
+SCHEMA = """
+-- Create users table
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    telegram_id INTEGER UNIQUE,
+    username TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    language_code TEXT,
+    notification_before_departure INTEGER DEFAULT 15,
+    notification_delay_threshold INTEGER DEFAULT 5,
+    notifications_paused BOOLEAN DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
 
-        # Create favorite stations table
-        await conn.execute('''
-    CREATE TABLE IF NOT EXISTS favorite_stations (
-        id INTEGER PRIMARY KEY,
-        user_id INTEGER,
-        station_id TEXT,
-        FOREIGN KEY (user_id) REFERENCES users(user_id),
-        UNIQUE(user_id, station_id)
-    )
-    ''')
+-- Create favorite stations table
+CREATE TABLE IF NOT EXISTS favorite_stations (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER,
+    station_id TEXT,
+    FOREIGN KEY (user_id) REFERENCES users(user_id),
+    UNIQUE(user_id, station_id)
+);
 
-        # Create subscriptions table
-        await conn.execute('''
-    CREATE TABLE IF NOT EXISTS subscriptions (
-        subscription_id INTEGER PRIMARY KEY,
-        user_id INTEGER,
-        departure_station TEXT,
-        arrival_station TEXT,
-        day_of_week INTEGER,
-        departure_time TEXT,
-        active BOOLEAN DEFAULT 1,
-        start_date DATE,
-        end_date DATE,
-        notify_before_departure BOOLEAN DEFAULT 1,
-        notify_delay BOOLEAN DEFAULT 1,
-        notify_arrival BOOLEAN DEFAULT 0,
-        last_status TEXT,
-        last_checked TIMESTAMP,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users(user_id)
-    )
-    ''')
+-- Create subscriptions table
+CREATE TABLE IF NOT EXISTS subscriptions (
+    subscription_id INTEGER PRIMARY KEY,
+    user_id INTEGER,
+    departure_station TEXT,
+    arrival_station TEXT,
+    day_of_week INTEGER,
+    departure_time TEXT,
+    active BOOLEAN DEFAULT 1,
+    start_date DATE,
+    end_date DATE,
+    notify_before_departure BOOLEAN DEFAULT 1,
+    notify_delay BOOLEAN DEFAULT 1,
+    notify_arrival BOOLEAN DEFAULT 0,
+    last_status TEXT,
+    last_checked TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
 
-        # Create notifications table
-        await conn.execute('''
-    CREATE TABLE IF NOT EXISTS notifications (
-        notification_id INTEGER PRIMARY KEY,
-        subscription_id INTEGER,
-        notification_type TEXT,
-        message TEXT,
-        sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (subscription_id) REFERENCES subscriptions(subscription_id)
-    )
-    ''')
+-- Create notifications table
+CREATE TABLE IF NOT EXISTS notifications (
+    notification_id INTEGER PRIMARY KEY,
+    subscription_id INTEGER,
+    notification_type TEXT,
+    message TEXT,
+    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (subscription_id) REFERENCES subscriptions(subscription_id)
+);
 
+-- Create timetables table, persisting fetched train times across restarts.
+-- day_of_week resolves to a date relative to fetched_for, so rows are only valid that day.
+CREATE TABLE IF NOT EXISTS timetables (
+    departure_station TEXT NOT NULL,
+    arrival_station TEXT NOT NULL,
+    day_of_week INTEGER NOT NULL,
+    fetched_for DATE NOT NULL,
+    train_times TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 1,
+    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (departure_station, arrival_station, day_of_week, fetched_for)
+);
+
+-- Create indexes for the hot query predicates. users(telegram_id) and
+-- favorite_stations(user_id, ...) are already covered by their UNIQUE constraints.
+CREATE INDEX IF NOT EXISTS idx_sub_user_active ON subscriptions(user_id, active);
+CREATE INDEX IF NOT EXISTS idx_sub_active_day ON subscriptions(active, day_of_week);
+CREATE INDEX IF NOT EXISTS idx_notif_sub ON notifications(subscription_id);
+"""
+
+async def setup_database():
+    """Create the database tables if they don't exist."""
+    async with aiosqlite.connect(DB_PATH) as conn:
+        # Apply PRAGMAs and create all tables and indexes in one call
+        await conn.executescript(";\n".join(PRAGMAS) + ";\n" + SCHEMA)
         await conn.commit()
@@ -1,11 +1,98 @@
 """Database operations for the train bot."""
 
+import asyncio
+import logging
 import aiosqlite
 from datetime import datetime
 import json
 from typing import List, Dict, Optional, Tuple, Any
 
+from cachetools import LRUCache, TTLCache
+
 from .models import DB_PATH
+from .pool import ConnectionPool
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Shared connection pool, opened lazily on first use
+pool = ConnectionPool(DB_PATH)
+
+# Seconds between forced WAL checkpoints
+WAL_CHECKPOINT_INTERVAL = 300
+
+# Background WAL checkpoint task
+_checkpoint_task: Optional[asyncio.Task] = None
+
+async def _checkpoint_wal_periodically(interval: int) -> None:
+    """Truncate the WAL file periodically so it doesn't grow between bursts of writes."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with pool.writer() as conn:
+                await conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except Exception:
+            logger.exception("Error checkpointing WAL")
+
+def start_wal_checkpoints(interval: int = WAL_CHECKPOINT_INTERVAL) -> None:
+    """Start the background WAL checkpoint task if it isn't running."""
+    global _checkpoint_task
+    if _checkpoint_task is None or _checkpoint_task.done():
+        _checkpoint_task = asyncio.create_task(_checkpoint_wal_periodically(interval))
+
+async def close_pool() -> None:
+    """Stop background maintenance and close all pooled database connections."""
+    global _checkpoint_task
+    if _checkpoint_task is not None:
+        _checkpoint_task.cancel()
+        _checkpoint_task = None
+    await pool.close()
+
+# Status stored on newly created subscriptions
+INITIAL_STATUS = json.dumps({"status": "unknown"})
+
+# Compact encoder for stored statuses, built once instead of per json.dumps call
+STATUS_ENCODER = json.JSONEncoder(separators=(",", ":"))
+
+# Frequently used queries, kept as constants so every call reuses the same
+# SQL text and hits the connection's prepared statement cache
+USER_FAVORITE_STATIONS_QUERY = """
+    SELECT group_concat(station_id, ',') FROM favorite_stations
+    WHERE user_id = ?
+"""
+FAVORITES_BY_TELEGRAM_ID_QUERY = """
+    SELECT u.user_id,
+           (SELECT json_group_array(station_id) FROM favorite_stations WHERE user_id = u.user_id)
+    FROM users u
+    WHERE u.telegram_id = ?
+"""
+USER_SUBSCRIPTIONS_QUERY = """
+    SELECT subscription_id, departure_station, arrival_station, day_of_week, departure_time
+    FROM subscriptions
+    WHERE user_id = ?
+"""
+USER_ACTIVE_SUBSCRIPTIONS_QUERY = USER_SUBSCRIPTIONS_QUERY + " AND active = 1"
+SUBSCRIPTIONS_BY_TELEGRAM_ID_QUERY = """
+    SELECT u.user_id, s.subscription_id, s.departure_station, s.arrival_station,
+           s.day_of_week, s.departure_time
+    FROM users u
+    LEFT JOIN subscriptions s ON s.user_id = u.user_id{active_filter}
+    WHERE u.telegram_id = ?
+"""
+ACTIVE_SUBSCRIPTIONS_BY_TELEGRAM_ID_QUERY = SUBSCRIPTIONS_BY_TELEGRAM_ID_QUERY.format(active_filter=" AND s.active = 1")
+ALL_SUBSCRIPTIONS_BY_TELEGRAM_ID_QUERY = SUBSCRIPTIONS_BY_TELEGRAM_ID_QUERY.format(active_filter="")
+
+# Caches for rarely changing reads, invalidated on writes
+favorite_stations_cache = TTLCache(maxsize=4096, ttl=60)
+# User ID -> active subscriptions, kept briefly so menu navigation doesn't re-query
+user_subscriptions_cache = TTLCache(maxsize=10_000, ttl=30)
+
+# Telegram ID -> user ID, which never changes once the user exists
+user_id_cache = LRUCache(maxsize=10_000)
+
+def invalidate_user_subscriptions(user_id: int) -> None:
+    """Drop a user's cached subscription list so the next read hits the database."""
+    user_subscriptions_cache.pop(user_id, None)
 
 # Default user preferences
 DEFAULT_USER_PREFERENCES = {
@@ -17,58 +104,91 @@ DEFAULT_USER_PREFERENCES = {
 async def get_or_create_user(telegram_id: int, username: Optional[str] = None, first_name: Optional[str] = None, 
                            last_name: Optional[str] = None, language_code: Optional[str] = None) -> Optional[int]:
     """Get a user from the database or create if not exists."""
-    async with aiosqlite.connect(DB_PATH) as conn:
+    async with pool.writer() as conn:
+        # Single round-trip upsert; RETURNING needs SQLite 3.35+
         async with conn.execute(
-            "SELECT user_id FROM users WHERE telegram_id = ?", (telegram_id,)
+            """
+            INSERT INTO users (telegram_id, username, first_name, last_name, language_code)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(telegram_id) DO UPDATE SET username = excluded.username
+            RETURNING user_id
+            """,
+            (telegram_id, username, first_name, last_name, language_code),
         ) as cursor:
             result = await cursor.fetchone()
+        await conn.commit()
 
-        if result:
-            user_id = result[0]
-        else:
-            async with conn.execute(
-                "INSERT INTO users (telegram_id, username, first_name, last_name, language_code) VALUES (?, ?, ?, ?, ?)",
-                (telegram_id, username, first_name, last_name, language_code),
-            ) as cursor:
-                await conn.commit()
-                user_id = cursor.lastrowid
+        if not result:
+            return None
+        user_id_cache[telegram_id] = result[0]
+        return result[0]
 
+async def get_user_id_or_none(telegram_id: int) -> Optional[int]:
+    """Get an existing user's ID without writing, or None if the user doesn't exist."""
+    user_id = user_id_cache.get(telegram_id)
+    if user_id is not None:
         return user_id
+    
+    async with pool.reader() as conn:
+        async with conn.execute("SELECT user_id FROM users WHERE telegram_id = ?", (telegram_id,)) as cursor:
+            row = await cursor.fetchone()
+    
+    if not row:
+        return None
+    
+    user_id_cache[telegram_id] = row[0]
+    return row[0]
 
 async def get_user_favorite_stations(user_id: int) -> List[str]:
     """Get a user's favorite station IDs from the database."""
-    async with aiosqlite.connect(DB_PATH) as conn:
-        async with conn.execute(
-            """
-            SELECT station_id FROM favorite_stations
-            WHERE user_id = ?
-            """,
-            (user_id,)
-        ) as cursor:
-            rows = await cursor.fetchall()
-            return [row[0] for row in rows]
+    cached = favorite_stations_cache.get(user_id)
+    if cached is not None:
+        return list(cached)
+    
+    async with pool.reader() as conn:
+        async with conn.execute(USER_FAVORITE_STATIONS_QUERY, (user_id,)) as cursor:
+            row = await cursor.fetchone()
+            station_ids = row[0].split(',') if row and row[0] else []
+    
+    favorite_stations_cache[user_id] = tuple(station_ids)
+    return station_ids
+
+async def get_favorites_for_telegram_id(telegram_id: int) -> Optional[Tuple[int, List[str]]]:
+    """Get a user's ID and favorite station IDs in one query, or None if the user doesn't exist."""
+    async with pool.reader() as conn:
+        async with conn.execute(FAVORITES_BY_TELEGRAM_ID_QUERY, (telegram_id,)) as cursor:
+            row = await cursor.fetchone()
+    
+    if not row:
+        return None
+    
+    user_id = row[0]
+    station_ids = json.loads(row[1]) if row[1] else []
+    favorite_stations_cache[user_id] = tuple(station_ids)
+    return user_id, station_ids
 
 async def add_favorite_station(user_id: int, station_id: str) -> bool:
     """Add a station to user's favorites."""
     success = False
     
     try:
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with pool.writer() as conn:
             await conn.execute(
                 "INSERT OR IGNORE INTO favorite_stations (user_id, station_id) VALUES (?, ?)",
                 (user_id, station_id)
             )
             await conn.commit()
             success = True
-    except Exception as e:
-        print(f"Error adding favorite station: {e}")
+        favorite_stations_cache.pop(user_id, None)
+    except Exception:
+        logger.exception("Error adding favorite station")
     
     return success
 
 async def get_subscription_by_id(subscription_id: int) -> Optional[Dict[str, Any]]:
     """Get subscription details by ID."""
     try:
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with pool.reader() as conn:
             async with conn.execute(
                 """
                 SELECT s.subscription_id, s.user_id, u.telegram_id,
@@ -95,8 +215,8 @@ async def get_subscription_by_id(subscription_id: int) -> Optional[Dict[str, Any
                     "departure_time": row[6],
                     "last_status": row[7]
                 }
-    except Exception as e:
-        print(f"Error getting subscription by ID: {e}")
+    except Exception:
+        logger.exception("Error getting subscription by ID")
         return None
 
 async def remove_favorite_station(user_id: int, station_id: str) -> bool:
@@ -104,41 +224,75 @@ async def remove_favorite_station(user_id: int, station_id: str) -> bool:
     success = False
     
     try:
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with pool.writer() as conn:
             await conn.execute(
                 "DELETE FROM favorite_stations WHERE user_id = ? AND station_id = ?",
                 (user_id, station_id)
             )
             await conn.commit()
             success = True
-    except Exception as e:
-        print(f"Error removing favorite station: {e}")
+        favorite_stations_cache.pop(user_id, None)
+    except Exception:
+        logger.exception("Error removing favorite station")
     
     return success
 
 async def get_user_subscriptions(user_id: int, active_only: bool = True) -> List[Dict[str, Any]]:
     """Get user's subscriptions."""
-    query = """
-        SELECT subscription_id, departure_station, arrival_station, day_of_week, departure_time
-        FROM subscriptions
-        WHERE user_id = ?
-    """
     if active_only:
-        query += " AND active = 1"
+        cached = user_subscriptions_cache.get(user_id)
+        if cached is not None:
+            return [dict(sub) for sub in cached]
+    
+    query = USER_ACTIVE_SUBSCRIPTIONS_QUERY if active_only else USER_SUBSCRIPTIONS_QUERY
     
-    async with aiosqlite.connect(DB_PATH) as conn:
+    async with pool.reader() as conn:
         async with conn.execute(query, (user_id,)) as cursor:
             rows = await cursor.fetchall()
-            return [
-                {
-                    "id": sub[0],
-                    "departure_station": sub[1],
-                    "arrival_station": sub[2],
-                    "day_of_week": sub[3],
-                    "departure_time": sub[4]
-                }
-                for sub in rows
-            ]
+    
+    subscriptions = [
+        {
+            "id": sub[0],
+            "departure_station": sub[1],
+            "arrival_station": sub[2],
+            "day_of_week": sub[3],
+            "departure_time": sub[4]
+        }
+        for sub in rows
+    ]
+    if active_only:
+        user_subscriptions_cache[user_id] = tuple(dict(sub) for sub in subscriptions)
+    return subscriptions
+
+async def get_subscriptions_for_telegram_id(telegram_id: int, active_only: bool = True
+                                            ) -> Optional[Tuple[int, List[Dict[str, Any]]]]:
+    """Get a user's ID and subscriptions in one query, or None if the user doesn't exist."""
+    query = ACTIVE_SUBSCRIPTIONS_BY_TELEGRAM_ID_QUERY if active_only else ALL_SUBSCRIPTIONS_BY_TELEGRAM_ID_QUERY
+    
+    async with pool.reader() as conn:
+        async with conn.execute(query, (telegram_id,)) as cursor:
+            rows = await cursor.fetchall()
+    
+    if not rows:
+        return None
+    
+    user_id = rows[0][0]
+    user_id_cache[telegram_id] = user_id
+    # A user without subscriptions comes back as one row of NULL subscription columns
+    subscriptions = [
+        {
+            "id": row[1],
+            "departure_station": row[2],
+            "arrival_station": row[3],
+            "day_of_week": row[4],
+            "departure_time": row[5]
+        }
+        for row in rows
+        if row[1] is not None
+    ]
+    if active_only:
+        user_subscriptions_cache[user_id] = tuple(dict(sub) for sub in subscriptions)
+    return user_id, subscriptions
 
 async def create_subscription(user_id: int, departure_station: str, arrival_station: str,
                             day_of_week: int, departure_time: str) -> Optional[int]:
@@ -146,13 +300,13 @@ async def create_subscription(user_id: int, departure_station: str, arrival_stat
     subscription_id = None
     
     try:
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with pool.writer() as conn:
             async with conn.execute(
                 """
                 INSERT INTO subscriptions 
                 (user_id, departure_station, arrival_station, day_of_week, departure_time, 
                 start_date, active, last_status)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                VALUES (?, ?, ?, ?, ?, DATE('now', 'localtime'), 1, ?)
                 """,
                 (
                     user_id,
@@ -160,15 +314,14 @@ async def create_subscription(user_id: int, departure_station: str, arrival_stat
                     arrival_station,
                     day_of_week,
                     departure_time,
-                    datetime.now().date().isoformat(),
-                    1,
-                    json.dumps({"status": "unknown"})
+                    INITIAL_STATUS
                 )
             ) as cursor:
                 await conn.commit()
                 subscription_id = cursor.lastrowid
-    except Exception as e:
-        print(f"Error creating subscription: {e}")
+        invalidate_user_subscriptions(user_id)
+    except Exception:
+        logger.exception("Error creating subscription")
     
     return subscription_id
 
@@ -177,15 +330,15 @@ async def cancel_subscription(subscription_id: int) -> bool:
     success = False
     
     try:
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with pool.writer() as conn:
             await conn.execute(
                 "UPDATE subscriptions SET active = 0 WHERE subscription_id = ?",
                 (subscription_id,)
             )
             await conn.commit()
             success = True
-    except Exception as e:
-        print(f"Error cancelling subscription: {e}")
+    except Exception:
+        logger.exception("Error cancelling subscription")
     
     return success
 
@@ -194,21 +347,21 @@ async def update_notification_settings(user_id: int, paused: bool) -> bool:
     success = False
     
     try:
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with pool.writer() as conn:
             await conn.execute(
                 "UPDATE users SET notifications_paused = ? WHERE user_id = ?",
                 (paused, user_id)
             )
             await conn.commit()
             success = True
-    except Exception as e:
-        print(f"Error updating notification settings: {e}")
+    except Exception:
+        logger.exception("Error updating notification settings")
     
     return success
 
 async def get_user_preferences(user_id: int) -> Dict[str, Any]:
     """Get user preferences including notification settings."""
-    async with aiosqlite.connect(DB_PATH) as conn:
+    async with pool.reader() as conn:
         async with conn.execute(
             """
             SELECT notification_before_departure, notification_delay_threshold,
@@ -0,0 +1,90 @@
+"""SQLite connection pool for the train bot."""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import aiosqlite
+
+from .models import apply_pragmas
+
+# Prepared statements kept per connection (sqlite3 defaults to 128)
+STATEMENT_CACHE_SIZE = 256
+
+class ConnectionPool:
+    """Pool with one dedicated writer connection and several read-only connections.
+
+    In WAL mode SQLite allows readers to proceed while a writer is active, so
+    read-only queries take a connection from the reader queue while all writes
+    are serialized on the single writer connection.
+    """
+
+    def __init__(self, db_path: str, readers: int = 4):
+        self.db_path = db_path
+        self.readers = readers
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._reader_queue: Optional[asyncio.Queue] = None
+        self._reader_conns = []
+        # Created in the running event loop; on Python 3.9 locks made at import bind to the default loop
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._open_lock: Optional[asyncio.Lock] = None
+
+    async def _connect(self, query_only: bool = False) -> aiosqlite.Connection:
+        """Open a tuned connection to the database."""
+        conn = await aiosqlite.connect(self.db_path, cached_statements=STATEMENT_CACHE_SIZE)
+        await apply_pragmas(conn)
+        if query_only:
+            await conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _get_open_lock(self) -> asyncio.Lock:
+        """Get the lock serializing open and close, created in the running event loop."""
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+        return self._open_lock
+
+    async def open(self) -> None:
+        """Open the writer and reader connections if not already open."""
+        async with self._get_open_lock():
+            if self._writer is not None:
+                return
+            self._write_lock = asyncio.Lock()
+            writer = await self._connect()
+            reader_queue = asyncio.Queue()
+            for _ in range(self.readers):
+                conn = await self._connect(query_only=True)
+                self._reader_conns.append(conn)
+                reader_queue.put_nowait(conn)
+            self._reader_queue = reader_queue
+            self._writer = writer
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection from the pool."""
+        if self._writer is None:
+            await self.open()
+        conn = await self._reader_queue.get()
+        try:
+            yield conn
+        finally:
+            self._reader_queue.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Get exclusive use of the writer connection."""
+        if self._writer is None:
+            await self.open()
+        async with self._write_lock:
+            yield self._writer
+
+    async def close(self) -> None:
+        """Close all connections in the pool."""
+        async with self._get_open_lock():
+            if self._writer is None:
+                return
+            for conn in self._reader_conns:
+                await conn.close()
+            await self._writer.close()
+            self._reader_conns = []
+            self._reader_queue = None
+            self._writer = None
@@ -0,0 +1,126 @@
+"""Persistent store for route timetables fetched from the train API."""
+
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from .operations import pool
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Number of most requested routes loaded into memory at startup
+PRELOAD_TIMETABLES = 500
+
+TrainTimes = Tuple[Tuple[str, str, int], ...]
+TimetableKey = Tuple[str, str, int, str]
+
+# Store reads per route not yet added to the hits column, flushed in batches by the write queue
+_pending_hits: Dict[TimetableKey, int] = {}
+
+# Age of a row in seconds, so loaded train times expire when the fetched ones would have
+ROW_AGE = "CAST(strftime('%s', 'now') - strftime('%s', fetched_at) AS INTEGER)"
+
+LOAD_TIMETABLE_QUERY = f"""
+    SELECT train_times, {ROW_AGE} FROM timetables
+    WHERE departure_station = ? AND arrival_station = ? AND day_of_week = ? AND fetched_for = ?
+      AND fetched_at >= datetime('now', ?)
+"""
+COUNT_HITS_QUERY = """
+    UPDATE timetables SET hits = hits + ?
+    WHERE departure_station = ? AND arrival_station = ? AND day_of_week = ? AND fetched_for = ?
+"""
+SAVE_TIMETABLE_QUERY = """
+    INSERT INTO timetables (departure_station, arrival_station, day_of_week, fetched_for, train_times)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (departure_station, arrival_station, day_of_week, fetched_for)
+    DO UPDATE SET train_times = excluded.train_times, hits = hits + 1, fetched_at = CURRENT_TIMESTAMP
+"""
+FREQUENT_TIMETABLES_QUERY = f"""
+    SELECT departure_station, arrival_station, day_of_week, train_times, {ROW_AGE} FROM timetables
+    WHERE fetched_for = ? AND fetched_at >= datetime('now', ?)
+    ORDER BY hits DESC
+    LIMIT ?
+"""
+PRUNE_TIMETABLES_QUERY = "DELETE FROM timetables WHERE fetched_for < ?"
+
+# Compact encoder for stored train times
+TRAIN_TIMES_ENCODER = json.JSONEncoder(separators=(",", ":"))
+
+def _max_age_modifier(max_age: int) -> str:
+    """Build the SQLite datetime modifier for rows fetched at most max_age seconds ago."""
+    return f"-{max_age} seconds"
+
+def _decode_train_times(payload: str) -> TrainTimes:
+    """Decode stored train times back into a tuple of (departure, arrival, switches) tuples."""
+    return tuple(tuple(train) for train in json.loads(payload))
+
+async def load_timetable(departure_station: str, arrival_station: str, day_of_week: int,
+                         fetched_for: str, max_age: int) -> Optional[Tuple[TrainTimes, int]]:
+    """Get stored train times for a route and their age in seconds, or None if none were fetched for that date in the last max_age seconds."""
+    params = (departure_station, arrival_station, day_of_week, fetched_for)
+    try:
+        async with pool.reader() as conn:
+            async with conn.execute(LOAD_TIMETABLE_QUERY, params + (_max_age_modifier(max_age),)) as cursor:
+                row = await cursor.fetchone()
+        if row is None:
+            return None
+        
+        # Counted in memory so reads don't wait on the writer connection
+        _pending_hits[params] = _pending_hits.get(params, 0) + 1
+        return _decode_train_times(row[0]), row[1]
+    except Exception:
+        logger.exception("Error loading stored timetable")
+        return None
+
+async def save_timetable(departure_station: str, arrival_station: str, day_of_week: int,
+                         fetched_for: str, train_times: TrainTimes) -> None:
+    """Store train times fetched for a route."""
+    try:
+        async with pool.writer() as conn:
+            await conn.execute(
+                SAVE_TIMETABLE_QUERY,
+                (departure_station, arrival_station, day_of_week, fetched_for,
+                 TRAIN_TIMES_ENCODER.encode(train_times))
+            )
+            await conn.commit()
+    except Exception:
+        logger.exception("Error storing timetable")
+
+async def flush_timetable_hits() -> None:
+    """Add the pending store reads to the hits column in a single transaction."""
+    if not _pending_hits:
+        return
+    
+    hits = list(_pending_hits.items())
+    try:
+        async with pool.writer() as conn:
+            await conn.executemany(COUNT_HITS_QUERY, [(count,) + key for key, count in hits])
+            await conn.commit()
+    except Exception:
+        # Keep the counts for the next flush
+        logger.exception("Error counting timetable hits")
+        return
+    
+    # Drop only the written counts; reads made during the write stay pending
+    for key, count in hits:
+        remaining = _pending_hits.pop(key, 0) - count
+        if remaining > 0:
+            _pending_hits[key] = remaining
+
+async def load_frequent_timetables(fetched_for: str, max_age: int, limit: int = PRELOAD_TIMETABLES
+                                   ) -> List[Tuple[str, str, int, TrainTimes, int]]:
+    """Get the most requested routes' train times stored for a date in the last max_age seconds, with their age in seconds."""
+    async with pool.reader() as conn:
+        async with conn.execute(FREQUENT_TIMETABLES_QUERY, (fetched_for, _max_age_modifier(max_age), limit)) as cursor:
+            rows = await cursor.fetchall()
+    return [
+        (departure_station, arrival_station, day_of_week, _decode_train_times(train_times), age)
+        for departure_station, arrival_station, day_of_week, train_times, age in rows
+    ]
+
+async def prune_timetables(fetched_for: str) -> None:
+    """Delete train times stored for dates before fetched_for."""
+    async with pool.writer() as conn:
+        await conn.execute(PRUNE_TIMETABLES_QUERY, (fetched_for,))
+        await conn.commit()
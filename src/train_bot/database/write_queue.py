@@ -0,0 +1,82 @@
+"""Batched subscription status and timetable hit writes for the train bot."""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from .operations import pool, STATUS_ENCODER
+from .timetable_store import flush_timetable_hits
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Flush once this many subscriptions have pending statuses, or after FLUSH_INTERVAL seconds
+FLUSH_BATCH_SIZE = 50
+FLUSH_INTERVAL = 0.1
+
+UPDATE_STATUS_QUERY = "UPDATE subscriptions SET last_status = ?, last_checked = ? WHERE subscription_id = ?"
+
+# Latest pending (last_status, last_checked) per subscription; a newer status replaces an unflushed one
+_pending: Dict[int, Tuple[str, str]] = {}
+# Set when a batch fills up; created with the writer, in the running event loop
+_batch_full: Optional[asyncio.Event] = None
+
+# Background writer task
+_writer_task: Optional[asyncio.Task] = None
+
+def queue_subscription_status(subscription_id: int, status: Dict[str, Any]) -> None:
+    """Queue a subscription's latest status to be written with the next batch."""
+    _pending[subscription_id] = (STATUS_ENCODER.encode(status), datetime.now().isoformat())
+    if len(_pending) >= FLUSH_BATCH_SIZE and _batch_full is not None:
+        _batch_full.set()
+
+async def flush_subscription_statuses() -> None:
+    """Write all pending statuses in a single transaction."""
+    if not _pending:
+        return
+
+    pending = list(_pending.items())
+    rows = [(status, checked_at, subscription_id) for subscription_id, (status, checked_at) in pending]
+
+    try:
+        async with pool.writer() as conn:
+            await conn.executemany(UPDATE_STATUS_QUERY, rows)
+            await conn.commit()
+    except Exception:
+        # Keep the statuses queued for the next flush
+        logger.exception("Error writing subscription statuses")
+        return
+
+    # Drop only the written statuses; newer ones queued during the write stay pending
+    for subscription_id, written in pending:
+        if _pending.get(subscription_id) is written:
+            del _pending[subscription_id]
+
+async def _write_periodically() -> None:
+    """Flush pending statuses and timetable hits every FLUSH_INTERVAL seconds, or sooner when a batch fills up."""
+    while True:
+        try:
+            await asyncio.wait_for(_batch_full.wait(), FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _batch_full.clear()
+        # Shielded so stopping the writer doesn't drop a batch mid-write
+        await asyncio.shield(flush_subscription_statuses())
+        await asyncio.shield(flush_timetable_hits())
+
+def start_status_writer() -> None:
+    """Start the background status writer if it isn't running."""
+    global _writer_task, _batch_full
+    if _writer_task is None or _writer_task.done():
+        _batch_full = asyncio.Event()
+        _writer_task = asyncio.create_task(_write_periodically())
+
+async def stop_status_writer() -> None:
+    """Stop the background status writer and write anything still pending."""
+    global _writer_task
+    if _writer_task is not None:
+        _writer_task.cancel()
+        _writer_task = None
+    await flush_subscription_statuses()
+    await flush_timetable_hits()
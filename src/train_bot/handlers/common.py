@@ -1,64 +1,168 @@
 """Common utilities for command handlers."""
 
 import logging
+import time
 from typing import Dict, Any, Optional, List
 
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
+import telegram.error
 from train_stations import TRAIN_STATIONS
 
-from ..database.operations import get_or_create_user
-from ..utils.constants import ConversationState, CallbackPrefix, HELP_MESSAGE, WELCOME_MESSAGE
+from ..database.operations import (
+    get_or_create_user,
+    get_user_id_or_none,
+    get_user_favorite_stations,
+    get_favorites_for_telegram_id,
+    get_user_subscriptions,
+    get_subscriptions_for_telegram_id
+)
+from ..utils.constants import ConversationState, HELP_MESSAGE, WELCOME_MESSAGE
 from ..utils.formatting import format_subscription_details
-from ..utils.keyboards import create_subscription_confirmation_keyboard
+from ..utils.keyboards import SUBSCRIPTION_CONFIRMATION_KEYBOARD, MAIN_MENU_BUTTON_KEYBOARD
 
-# Enable logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-)
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+
+# Station ID -> station record index
+_STATION_BY_ID = {station["id"]: station for station in TRAIN_STATIONS}
+
+async def resolve_user_id(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[int]:
+    """Get the database user ID for the current user, caching it in user_data."""
+    user_id = context.user_data.get("_user_id")
+    if user_id is None:
+        user = update.effective_user
+        # Existing users only need a read; fall back to the upsert for new users
+        user_id = await get_user_id_or_none(user.id)
+        if user_id is None:
+            user_id = await get_or_create_user(
+                user.id, user.username, user.first_name, user.last_name, user.language_code
+            )
+        context.user_data["_user_id"] = user_id
+    return user_id
+
+async def get_favorite_station_ids(update: Update, context: ContextTypes.DEFAULT_TYPE) -> List[str]:
+    """Get the current user's favorite station IDs, resolving the user in the same query."""
+    user_id = context.user_data.get("_user_id")
+    if user_id is not None:
+        return await get_user_favorite_stations(user_id)
+    
+    result = await get_favorites_for_telegram_id(update.effective_user.id)
+    if result is None:
+        # New user, register them; they have no favorites yet
+        await resolve_user_id(update, context)
+        return []
+    
+    context.user_data["_user_id"], favorite_station_ids = result
+    return favorite_station_ids
+
+async def get_active_subscriptions(update: Update, context: ContextTypes.DEFAULT_TYPE) -> List[Dict[str, Any]]:
+    """Get the current user's active subscriptions, resolving the user in the same query."""
+    user_id = context.user_data.get("_user_id")
+    if user_id is not None:
+        return await get_user_subscriptions(user_id)
+    
+    result = await get_subscriptions_for_telegram_id(update.effective_user.id)
+    if result is None:
+        # New user, register them; they have no subscriptions yet
+        await resolve_user_id(update, context)
+        return []
+    
+    context.user_data["_user_id"], subscriptions = result
+    return subscriptions
+
+# Seconds to keep a user's favorite station objects in user_data
+FAVORITES_CACHE_TTL = 300
+
+async def ensure_favorites(update: Update, context: ContextTypes.DEFAULT_TYPE) -> List[Dict[str, Any]]:
+    """Get the current user's favorite station objects, cached in user_data for FAVORITES_CACHE_TTL seconds."""
+    cached = context.user_data.get("_fav_cache")
+    if cached is not None and time.monotonic() - cached[0] < FAVORITES_CACHE_TTL:
+        return cached[1]
+    
+    favorite_stations = get_station_objects_by_ids(await get_favorite_station_ids(update, context))
+    context.user_data["_fav_cache"] = (time.monotonic(), favorite_stations)
+    return favorite_stations
+
+def invalidate_favorites(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Drop the user's cached favorite station objects after their favorites change."""
+    context.user_data.pop("_fav_cache", None)
+
+def _msg_id(update: Update) -> int:
+    """Get the ID of the message an update refers to."""
+    return (update.message or update.callback_query.message).message_id
+
+async def answer_callback_query(update: Update) -> None:
+    """Answer the current callback query so the client stops its loading spinner, logging failures."""
+    try:
+        await update.callback_query.answer()
+    except telegram.error.TelegramError as e:
+        logger.warning("Could not answer callback query: %s", e)
+
+class StatusContext:
+    """Per-message state of a status flow."""
+    
+    __slots__ = (
+        "type", "departure_station", "arrival_station",
+        "date_raw", "date_obj", "date_formatted", "day_of_week",
+        "train_times_key", "details_hash"
+    )
+    
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, None)
+    
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"StatusContext({fields})"
+
+def get_status_context(update: Update, context: ContextTypes.DEFAULT_TYPE) -> StatusContext:
+    """Get or create the status flow state for the current message."""
+    context_key = ("status", _msg_id(update))
+    
+    status_context = context.user_data.get(context_key)
+    if status_context is None:
+        status_context = context.user_data[context_key] = StatusContext()
+    
+    return status_context
 
 def get_message_context(update: Update, context: ContextTypes.DEFAULT_TYPE, prefix: str) -> Dict[str, Any]:
     """Get or create message-specific context data."""
-    message_id = update.message.message_id if update.message else update.callback_query.message.message_id
-    context_key = f"{prefix}_{message_id}"
+    message_id = _msg_id(update)
+    context_key = (prefix, message_id)
     
-    if context_key not in context.user_data:
-        context.user_data[context_key] = {}
+    message_context = context.user_data.get(context_key)
+    if message_context is None:
+        message_context = context.user_data[context_key] = {}
     
-    return context.user_data[context_key]
+    return message_context
 
 def clear_message_context(update: Update, context: ContextTypes.DEFAULT_TYPE, prefix: str) -> None:
     """Clear message-specific context data."""
-    message_id = update.message.message_id if update.message else update.callback_query.message.message_id
-    context_key = f"{prefix}_{message_id}"
+    message_id = _msg_id(update)
+    context_key = (prefix, message_id)
     
-    if context_key in context.user_data:
-        del context.user_data[context_key]
+    context.user_data.pop(context_key, None)
 
 def get_page_number(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Get the current page number for pagination."""
-    message_id = update.message.message_id if update.message else update.callback_query.message.message_id
-    return context.user_data.get(f"station_page_{message_id}", 0)
+    message_id = _msg_id(update)
+    return context.user_data.get(("station_page", message_id), 0)
 
 def set_page_number(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int) -> None:
     """Set the current page number for pagination."""
-    message_id = update.message.message_id if update.message else update.callback_query.message.message_id
-    context.user_data[f"station_page_{message_id}"] = page
+    message_id = _msg_id(update)
+    context.user_data[("station_page", message_id)] = page
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Send a message when the command /start is issued."""
     user = update.effective_user
-    logger.debug(f"Command /start executed by user {user.id} ({user.username})")
+    logger.debug("Command /start executed by user %s (%s)", user.id, user.username)
     
-    await get_or_create_user(
-        user.id, user.username, user.first_name, user.last_name, user.language_code
-    )
+    await resolve_user_id(update, context)
     
     # Create keyboard with main menu options
-    from ..utils.keyboards import create_main_menu_keyboard
-    keyboard = create_main_menu_keyboard()
+    from ..utils.keyboards import MAIN_MENU_KEYBOARD
+    keyboard = MAIN_MENU_KEYBOARD
     
     await update.message.reply_text(
         WELCOME_MESSAGE.format(first_name=user.first_name),
@@ -70,12 +174,10 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Send help message with menu button."""
     user = update.effective_user
-    logger.debug(f"Command /help executed by user {user.id} ({user.username})")
+    logger.debug("Command /help executed by user %s (%s)", user.id, user.username)
     
     # Create keyboard with return to menu
-    keyboard_buttons = []
-    keyboard_buttons.append([InlineKeyboardButton("Main Menu", callback_data=f"{CallbackPrefix.MENU}_main")])
-    keyboard = InlineKeyboardMarkup(keyboard_buttons)
+    keyboard = MAIN_MENU_BUTTON_KEYBOARD
     
     await update.message.reply_text(HELP_MESSAGE, reply_markup=keyboard)
     return ConversationState.MAIN_MENU
@@ -83,18 +185,16 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
 async def settings_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the /settings command."""
     user = update.effective_user
-    logger.debug(f"Command /settings executed by user {user.id} ({user.username})")
+    logger.debug("Command /settings executed by user %s (%s)", user.id, user.username)
     
     # Create keyboard with return to menu
-    keyboard_buttons = []
-    keyboard_buttons.append([InlineKeyboardButton("Main Menu", callback_data=f"{CallbackPrefix.MENU}_main")])
-    keyboard = InlineKeyboardMarkup(keyboard_buttons)
+    keyboard = MAIN_MENU_BUTTON_KEYBOARD
     
     await update.message.reply_text(
         "Settings functionality will be implemented in a future version.",
         reply_markup=keyboard
     )
-    logger.debug(f"Settings command completed for user {user.id}")
+    logger.debug("Settings command completed for user %s", user.id)
     return ConversationState.MAIN_MENU
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -102,7 +202,7 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
     logger.error("Exception while handling an update:", exc_info=context.error)
     
     # Send a message to the user
-    if update and isinstance(update, Update) and update.effective_message:
+    if update is not None and getattr(update, "effective_message", None):
         text = (
             "Sorry, an error occurred while processing your request.\n"
             "The conversation has been reset. Please try again using one of the main commands:\n"
@@ -132,19 +232,19 @@ def get_user_info(update: Update) -> Dict[str, Any]:
 def log_command(update: Update, command: str) -> None:
     """Log command execution."""
     user = update.effective_user
-    logger.debug(f"Command /{command} executed by user {user.id} ({user.username})")
+    logger.debug("Command /%s executed by user %s (%s)", command, user.id, user.username)
 
 def log_callback(update: Update, callback_data: str) -> None:
     """Log callback query execution."""
     user = update.effective_user
-    logger.debug(f"Callback executed by user {user.id} ({user.username}) with data: {callback_data}")
+    logger.debug("Callback executed by user %s (%s) with data: %s", user.id, user.username, callback_data)
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancel the current conversation."""
     if update.message:
         # Create keyboard with main menu options
-        from ..utils.keyboards import create_main_menu_keyboard
-        keyboard = create_main_menu_keyboard()
+        from ..utils.keyboards import MAIN_MENU_KEYBOARD
+        keyboard = MAIN_MENU_KEYBOARD
         
         await update.message.reply_text(
             "Operation cancelled. What would you like to do?",
@@ -167,17 +267,23 @@ async def back_to_train_list(update: Update, context: ContextTypes.DEFAULT_TYPE)
     query = update.callback_query
     await query.answer()
     
-    status_context = get_message_context(update, context, "status")
+    status_context = get_status_context(update, context)
     # Import here to avoid circular imports
     from .status_handlers_2 import get_future_train_status, get_current_train_status
-    if status_context["type"] == "future":
+    if status_context.type == "future":
         return await get_future_train_status(update, context)
     else:
         return await get_current_train_status(update, context)
 
+def get_station_by_id(station_id: str) -> Optional[Dict[str, Any]]:
+    """Get a station record by its ID."""
+    return _STATION_BY_ID.get(station_id)
+
 def get_station_objects_by_ids(station_ids: List[str]) -> List[Dict[str, Any]]:
     """Convert a list of station IDs to a list of station objects."""
-    return [station for station in TRAIN_STATIONS if station["id"] in station_ids]
+    # One dict lookup per ID, skipping unknown stations
+    lookup = _STATION_BY_ID.get
+    return [station for station in map(lookup, station_ids) if station is not None]
 
 async def subscribe_from_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start subscription process from status view."""
@@ -185,11 +291,13 @@ async def subscribe_from_status(update: Update, context: ContextTypes.DEFAULT_TY
     await query.answer()
     
     # Extract train index
-    train_index = int(query.data.split("_")[-1])
+    train_index = int(query.data.rpartition("_")[2])
     
     # Get train details from status context
-    status_context = get_message_context(update, context, "status")
-    train_times = status_context["train_times"]
+    status_context = get_status_context(update, context)
+    # Import here to avoid circular imports
+    from .status_handlers_2 import get_train_list
+    train_times = await get_train_list(status_context)
     if train_index >= len(train_times):
         await query.edit_message_text("Invalid train selection. Please try again.")
         return ConversationHandler.END
@@ -199,15 +307,15 @@ async def subscribe_from_status(update: Update, context: ContextTypes.DEFAULT_TY
     # Store subscription details
     subscription_context = get_message_context(update, context, "subscription")
     subscription_context.update({
-        "departure_station": status_context["departure_station"],
-        "arrival_station": status_context["arrival_station"],
+        "departure_station": status_context.departure_station,
+        "arrival_station": status_context.arrival_station,
         "departure_time": departure_time,
-        "day_of_week": status_context["date"]["day_of_week"] if "date" in status_context else None
+        "day_of_week": status_context.day_of_week
     })
     
     # Show subscription confirmation
     message = format_subscription_details(subscription_context)
-    keyboard = create_subscription_confirmation_keyboard()
+    keyboard = SUBSCRIPTION_CONFIRMATION_KEYBOARD
     
     await query.edit_message_text(message, reply_markup=keyboard)
     return ConversationState.CONFIRM_SUBSCRIPTION
@@ -3,27 +3,35 @@
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 
-from train_stations import TRAIN_STATIONS
 from ..database.operations import (
-    get_or_create_user,
-    get_user_favorite_stations,
     add_favorite_station,
     remove_favorite_station
 )
-from ..utils.constants import ConversationState, CallbackPrefix
+from ..utils.constants import (
+    ConversationState,
+    FAVORITE_ADD,
+    FAVORITE_REMOVE,
+    FAVORITE_DONE,
+    PAGE_PREFIX,
+    BACK_PREFIX
+)
 from ..utils.keyboards import (
-    create_favorites_keyboard,
+    FAVORITES_KEYBOARD,
     create_paginated_stations_keyboard
 )
 from ..utils.formatting import format_favorites_list
 from .common import (
+    get_favorite_station_ids,
+    resolve_user_id,
     get_message_context,
     clear_message_context,
     get_page_number,
     set_page_number,
     log_command,
     log_callback,
-    get_station_objects_by_ids
+    get_station_by_id,
+    get_station_objects_by_ids,
+    invalidate_favorites
 )
 
 async def start_favorites_flow(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -31,18 +39,14 @@ async def start_favorites_flow(update: Update, context: ContextTypes.DEFAULT_TYP
     query = update.callback_query
     
     # Get user's favorite stations
-    user = update.effective_user
-    user_id = await get_or_create_user(
-        user.id, user.username, user.first_name, user.last_name, user.language_code
-    )
-    favorite_station_ids = await get_user_favorite_stations(user_id)
+    favorite_station_ids = await get_favorite_station_ids(update, context)
     
     # Convert station IDs to station objects
     favorite_stations = get_station_objects_by_ids(favorite_station_ids)
     
     # Format message and create keyboard
     message = format_favorites_list(favorite_stations)
-    keyboard = create_favorites_keyboard()
+    keyboard = FAVORITES_KEYBOARD
     
     # Edit message
     await query.edit_message_text(message, reply_markup=keyboard)
@@ -54,18 +58,14 @@ async def favorites_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     log_command(update, "favorites")
     
     # Get user's favorite stations
-    user = update.effective_user
-    user_id = await get_or_create_user(
-        user.id, user.username, user.first_name, user.last_name, user.language_code
-    )
-    favorite_station_ids = await get_user_favorite_stations(user_id)
+    favorite_station_ids = await get_favorite_station_ids(update, context)
     
     # Convert station IDs to station objects
     favorite_stations = get_station_objects_by_ids(favorite_station_ids)
     
     # Format message and create keyboard
     message = format_favorites_list(favorite_stations)
-    keyboard = create_favorites_keyboard()
+    keyboard = FAVORITES_KEYBOARD
     
     # Send or edit message
     if update.message:
@@ -81,17 +81,19 @@ async def handle_favorite_action(update: Update, context: ContextTypes.DEFAULT_T
     log_callback(update, query.data)
     await query.answer()
     
-    if query.data == f"{CallbackPrefix.FAVORITE}_add":
-        # Reset page number and show all stations
-        set_page_number(update, context, 0)
-        return await show_add_favorites(update, context)
-    
-    elif query.data == f"{CallbackPrefix.FAVORITE}_remove":
-        return await show_remove_favorites(update, context)
-    
-    elif query.data == f"{CallbackPrefix.FAVORITE}_done":
-        await query.edit_message_text("Favorites management completed.")
-        return ConversationHandler.END
+    handler = _FAVORITE_ACTIONS.get(query.data)
+    if handler:
+        return await handler(update, context)
+
+async def start_add_favorites(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Reset the page number and show all stations for adding to favorites."""
+    set_page_number(update, context, 0)
+    return await show_add_favorites(update, context)
+
+async def finish_favorites(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """End favorites management."""
+    await update.callback_query.edit_message_text("Favorites management completed.")
+    return ConversationHandler.END
 
 async def show_add_favorites(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Show all stations for adding to favorites."""
@@ -103,7 +105,7 @@ async def show_add_favorites(update: Update, context: ContextTypes.DEFAULT_TYPE)
     # Create keyboard
     keyboard = create_paginated_stations_keyboard(
         page,
-        f"{CallbackPrefix.FAVORITE}_add"
+        FAVORITE_ADD
     )
     
     # Update message
@@ -119,11 +121,7 @@ async def show_remove_favorites(update: Update, context: ContextTypes.DEFAULT_TY
     query = update.callback_query
     
     # Get user's favorite stations
-    user = update.effective_user
-    user_id = await get_or_create_user(
-        user.id, user.username, user.first_name, user.last_name, user.language_code
-    )
-    favorite_station_ids = await get_user_favorite_stations(user_id)
+    favorite_station_ids = await get_favorite_station_ids(update, context)
     
     if not favorite_station_ids:
         await query.edit_message_text(
@@ -138,7 +136,7 @@ async def show_remove_favorites(update: Update, context: ContextTypes.DEFAULT_TY
     # Create keyboard
     keyboard = create_paginated_stations_keyboard(
         0,  # No pagination for favorites
-        f"{CallbackPrefix.FAVORITE}_remove",
+        FAVORITE_REMOVE,
         stations=favorite_stations
     )
     
@@ -155,30 +153,25 @@ async def add_favorite_station_handler(update: Update, context: ContextTypes.DEF
     await query.answer()
     
     # Handle pagination
-    if query.data.startswith(f"{CallbackPrefix.PAGE}_"):
-        parts = query.data.split("_")
-        page = int(parts[-1])
+    if query.data.startswith(PAGE_PREFIX):
+        page = int(query.data.rpartition("_")[2])
         set_page_number(update, context, page)
         return await show_add_favorites(update, context)
     
     # Handle back to favorites
-    if query.data.startswith(f"{CallbackPrefix.BACK}_"):
+    if query.data.startswith(BACK_PREFIX):
         return await favorites_command(update, context)
     
     # Extract station ID and add to favorites
-    station_id = query.data.split("_")[-1]
-    user = update.effective_user
-    user_id = await get_or_create_user(
-        user.id, user.username, user.first_name, user.last_name, user.language_code
-    )
+    station_id = query.data.rpartition("_")[2]
+    user_id = await resolve_user_id(update, context)
     
     # Find station name
-    station_name = next(
-        (station["english"] for station in TRAIN_STATIONS if station["id"] == station_id),
-        "Unknown"
-    )
+    station = get_station_by_id(station_id)
+    station_name = station["english"] if station else "Unknown"
     
     if await add_favorite_station(user_id, station_id):
+        invalidate_favorites(context)
         await query.edit_message_text(
             f"✅ Added {station_name} to your favorites.\n\n"
             "Use /favorites to manage your favorites."
@@ -196,24 +189,20 @@ async def remove_favorite_station_handler(update: Update, context: ContextTypes.
     await query.answer()
     
     # Handle done request
-    if query.data == f"{CallbackPrefix.FAVORITE}_done":
+    if query.data == FAVORITE_DONE:
         await query.edit_message_text("Favorites management completed.")
         return ConversationHandler.END
     
     # Extract station ID and remove from favorites
-    station_id = query.data.split("_")[-1]
-    user = update.effective_user
-    user_id = await get_or_create_user(
-        user.id, user.username, user.first_name, user.last_name, user.language_code
-    )
+    station_id = query.data.rpartition("_")[2]
+    user_id = await resolve_user_id(update, context)
     
     # Find station name
-    station_name = next(
-        (station["english"] for station in TRAIN_STATIONS if station["id"] == station_id),
-        "Unknown"
-    )
+    station = get_station_by_id(station_id)
+    station_name = station["english"] if station else "Unknown"
     
     if await remove_favorite_station(user_id, station_id):
+        invalidate_favorites(context)
         await query.edit_message_text(
             f"✅ Removed {station_name} from your favorites."
         )
@@ -224,3 +213,10 @@ async def remove_favorite_station_handler(update: Update, context: ContextTypes.
             "❌ Sorry, there was an error removing the station from your favorites."
         )
         return ConversationHandler.END
+
+# Favorites action callback data -> handler
+_FAVORITE_ACTIONS = {
+    FAVORITE_ADD: start_add_favorites,
+    FAVORITE_REMOVE: show_remove_favorites,
+    FAVORITE_DONE: finish_favorites,
+}
@@ -1,38 +1,37 @@
 """Notification command handlers for the train bot."""
 
+import hashlib
 import logging
 import json
 from datetime import datetime, timedelta
-import aiosqlite
+from typing import Optional
 
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram import Update
 from telegram.ext import ContextTypes
 import telegram.error
 
 import train_facade
 from ..database.operations import (
-    get_or_create_user,
     update_notification_settings,
     get_subscription_by_id
 )
-from ..database.models import DB_PATH
+from ..database.write_queue import queue_subscription_status
 from ..utils.formatting import format_train_details
-from .common import log_command, log_callback
-from train_stations import TRAIN_STATIONS
+from ..utils.constants import PY_WEEKDAY_TO_DAY_OF_WEEK
+from ..utils.date_utils import parse_iso
+from ..utils.keyboards import create_notification_refresh_keyboard
+from ..utils.api_cache import cached_get_delay
+from .common import log_command, log_callback, answer_callback_query, get_station_by_id, resolve_user_id
 
 # Configure logger
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
 async def pause_notifications_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Pause all notifications for the user."""
     log_command(update, "pause")
     
     # Get user ID
-    user = update.effective_user
-    user_id = await get_or_create_user(
-        user.id, user.username, user.first_name, user.last_name, user.language_code
-    )
+    user_id = await resolve_user_id(update, context)
     
     # Update notifications_paused flag
     if await update_notification_settings(user_id, paused=True):
@@ -51,10 +50,7 @@ async def resume_notifications_command(update: Update, context: ContextTypes.DEF
     log_command(update, "resume")
     
     # Get user ID
-    user = update.effective_user
-    user_id = await get_or_create_user(
-        user.id, user.username, user.first_name, user.last_name, user.language_code
-    )
+    user_id = await resolve_user_id(update, context)
     
     # Update notifications_paused flag
     if await update_notification_settings(user_id, paused=False):
@@ -74,27 +70,40 @@ async def settings_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         "Settings functionality will be implemented in a future version."
     )
 
+async def _show_refresh_error(update: Update, text: str, subscription_id: Optional[int] = None) -> None:
+    """Replace a notification with an error, keeping the refresh button so the user can retry."""
+    keyboard = create_notification_refresh_keyboard(subscription_id) if subscription_id is not None else None
+    try:
+        await update.callback_query.edit_message_text(text, reply_markup=keyboard)
+    except telegram.error.BadRequest as e:
+        # The message already shows this error
+        if "Message is not modified" not in str(e):
+            logger.error("Could not show refresh error: %s", e)
+
 async def refresh_notification_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the refresh button click from notification messages."""
     query = update.callback_query
     log_callback(update, query.data)
+    # Answer before fetching so the client stops its loading spinner; errors are shown in the message
+    await answer_callback_query(update)
     
+    subscription_id = None
     try:
         # Extract subscription ID from callback data
-        subscription_id = int(query.data.split("_")[-1])
+        subscription_id = int(query.data.rpartition("_")[2])
         
         # Get subscription details
         subscription = await get_subscription_by_id(subscription_id)
         if not subscription:
-            await query.answer("Subscription not found", show_alert=True)
+            await _show_refresh_error(
+                update, "Subscription not found. Use /subscriptions to manage your subscriptions."
+            )
             return
         
         # Get station names
         def get_station_name(station_id):
-            for station in TRAIN_STATIONS:
-                if station["id"] == station_id:
-                    return station["english"]
-            return "Unknown Station"
+            station = get_station_by_id(station_id)
+            return station["english"] if station else "Unknown Station"
         
         departure_station_name = get_station_name(subscription["departure_station"])
         arrival_station_name = get_station_name(subscription["arrival_station"])
@@ -104,48 +113,59 @@ async def refresh_notification_status(update: Update, context: ContextTypes.DEFA
         arrival_station_obj = {"name": arrival_station_name, "id": subscription["arrival_station"]}
         
         # Parse departure time (using the train on current/next day logic)
-        departure_dt = datetime.fromisoformat(subscription["departure_time"])
-        
-        # Get the current day of week
-        current_day = datetime.now().weekday()
-        # Adjust for Sunday=0 in our system vs Monday=0 in Python's
-        current_day = (current_day + 1) % 7
-        
-        # Check if this is the subscription's day or the next day
-        day_of_week = subscription["day_of_week"]
-        is_subscription_day = current_day == day_of_week
-        
-        # Get the appropriate date for the train
-        if is_subscription_day:
-            train_date = datetime.now().date()
-        else:
-            # Get the next occurrence of this day
-            days_ahead = (day_of_week - current_day) % 7
-            train_date = (datetime.now() + timedelta(days=days_ahead)).date()
-        
-        # Combine date and time
-        train_datetime = datetime.combine(
-            train_date,
-            departure_dt.time()
-        )
+        departure_dt = parse_iso(subscription["departure_time"])
         
-        # Format time for API
-        api_time_format = train_datetime.strftime("%Y-%m-%dT%H:%M:%S")
+        # Snapshot the current time once for the whole refresh
+        now = datetime.now()
+        today = now.date()
+        today_iso = today.isoformat()
+        
+        # Try to preserve fields from previous status
+        try:
+            prev_status = json.loads(subscription["last_status"] or "{}")
+            # Keep important fields from previous status
+            departure_reminder_sent = prev_status.get("departure_reminder_sent", False)
+            last_notification_sent_at = prev_status.get("last_notification_sent_at")
+            prev_body_hash = prev_status.get("body_hash")
+            # Train time for the API, if already computed today
+            api_time_format = (prev_status.get("next_api_time")
+                               if prev_status.get("computed_for_date") == today_iso else None)
+        except (json.JSONDecodeError, TypeError):
+            departure_reminder_sent = False
+            last_notification_sent_at = None
+            prev_body_hash = None
+            api_time_format = None
+        
+        if api_time_format is None:
+            # Get the current day of week (0=Sunday)
+            current_day = PY_WEEKDAY_TO_DAY_OF_WEEK[today.weekday()]
+            
+            # Get the next occurrence of the subscription's day, today if it is that day
+            days_ahead = (subscription["day_of_week"] - current_day) % 7
+            train_date = today + timedelta(days=days_ahead)
+            
+            # Combine date and time, formatted for the API
+            api_time_format = datetime.combine(
+                train_date,
+                departure_dt.time()
+            ).strftime("%Y-%m-%dT%H:%M:%S")
         
         # Get updated train status from API
         train_times = None
         try:
-            train_times = train_facade.get_delay_from_api(
+            train_times = await cached_get_delay(
                 subscription["departure_station"],
                 subscription["arrival_station"],
                 api_time_format
             )
         except train_facade.TrainNotFoundError:
-            await query.answer("Train schedule not found", show_alert=True)
+            await _show_refresh_error(update, "❌ Train schedule not found.", subscription_id)
             return
         except Exception as e:
-            logger.error(f"API error: {e}")
-            await query.answer("Error fetching train status", show_alert=True)
+            logger.error("API error: %s", e)
+            await _show_refresh_error(
+                update, "❌ Error fetching train status. Please try again.", subscription_id
+            )
             return
         
         # Format updated message
@@ -157,7 +177,7 @@ async def refresh_notification_status(update: Update, context: ContextTypes.DEFA
             switches=len(train_times.switch_stations) if train_times.switch_stations else 0,
             delay_minutes=train_times.delay_in_minutes,
             switch_stations=train_times.switch_stations,
-            last_updated=datetime.now()
+            last_updated=now
         )
         
         # Add notification context
@@ -167,10 +187,32 @@ async def refresh_notification_status(update: Update, context: ContextTypes.DEFA
         )
         
         # Create refresh keyboard
-        callback_data = f"refresh_notif_{subscription_id}"
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("🔄 Refresh", callback_data=callback_data)]
-        ])
+        keyboard = create_notification_refresh_keyboard(subscription_id)
+        
+        # Skip the edit if this message already shows the same body (and not a refresh error since)
+        body_hash = hashlib.blake2b(
+            f"{query.message.message_id}:{message}".encode(), digest_size=8
+        ).hexdigest()
+        if body_hash == prev_body_hash and query.message.text == message:
+            logger.debug("Notification for subscription %s is up to date", subscription_id)
+            return
+        
+        # Status to store once the message shows it
+        updated_status = {
+                "status": "delayed" if train_times.delay_in_minutes > 0 else "on-time",
+            "delay_minutes": train_times.delay_in_minutes,
+            "updated_departure": train_times.get_updated_departure().isoformat(),
+            "updated_arrival": train_times.get_updated_arrival().isoformat(),
+            "switch_stations": train_times.switch_stations,
+            "departure_reminder_sent": departure_reminder_sent,  # Keep this flag if it was set
+            "body_hash": body_hash,
+            "next_api_time": api_time_format,
+            "computed_for_date": today_iso
+        }
+        
+        # Preserve notification tracking field if it exists
+        if last_notification_sent_at:
+            updated_status["last_notification_sent_at"] = last_notification_sent_at
         
         # Update the message with new information
         try:
@@ -178,44 +220,14 @@ async def refresh_notification_status(update: Update, context: ContextTypes.DEFA
                 message,
                 reply_markup=keyboard
             )
-            # Try to preserve fields from previous status
-            try:
-                prev_status = json.loads((await get_subscription_by_id(subscription_id))["last_status"] or "{}")
-                # Keep important fields from previous status
-                departure_reminder_sent = prev_status.get("departure_reminder_sent", False)
-                last_notification_sent_at = prev_status.get("last_notification_sent_at")
-            except (json.JSONDecodeError, TypeError):
-                departure_reminder_sent = False
-                last_notification_sent_at = None
-                
-            # Update status in database
-            updated_status = {
-                "status": "delayed" if train_times.delay_in_minutes > 0 else "on-time",
-                "delay_minutes": train_times.delay_in_minutes,
-                "updated_departure": train_times.get_updated_departure().isoformat(),
-                "updated_arrival": train_times.get_updated_arrival().isoformat(),
-                "switch_stations": train_times.switch_stations,
-                "departure_reminder_sent": departure_reminder_sent  # Keep this flag if it was set
-            }
-            
-            # Preserve notification tracking field if it exists
-            if last_notification_sent_at:
-                updated_status["last_notification_sent_at"] = last_notification_sent_at
-            
-            async with aiosqlite.connect(DB_PATH) as conn:
-                await conn.execute(
-                    "UPDATE subscriptions SET last_status = ?, last_checked = ? WHERE subscription_id = ?",
-                    (json.dumps(updated_status), datetime.now().isoformat(), subscription_id)
-                )
-                await conn.commit()
-            
         except telegram.error.BadRequest as e:
             # Handle case when content hasn't changed
-            if "Message is not modified" in str(e):
-                await query.answer("Train status is up to date", show_alert=True)
-            else:
+            if "Message is not modified" not in str(e):
                 # Re-raise if it's a different BadRequest error
                 raise
+        
+        # Update status in database; nothing after the edit can fail before this
+        queue_subscription_status(subscription_id, updated_status)
     except Exception as e:
-        logger.error(f"Error refreshing notification: {str(e)}", exc_info=e)
-        await query.answer("Failed to refresh train status", show_alert=True)
+        logger.error("Error refreshing notification: %s", e, exc_info=e)
+        await _show_refresh_error(update, "❌ Failed to refresh train status. Please try again.", subscription_id)
@@ -7,11 +7,17 @@ from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 
 import train_facade
-from train_stations import TRAIN_STATIONS
-from ..database.operations import get_or_create_user, get_user_favorite_stations
-from ..utils.constants import ConversationState, CallbackPrefix
+from ..utils.constants import (
+    ConversationState,
+    STATUS_DEP,
+    STATUS_ARR,
+    STATUS_DEP_PREFIX,
+    STATUS_FUTURE,
+    SHOW_ALL_STATUS_DEP,
+    STATUS_PAGE_RE
+)
 from ..utils.keyboards import (
-    create_status_action_keyboard,
+    STATUS_ACTION_KEYBOARD,
     create_station_keyboard,
     create_paginated_stations_keyboard,
     create_date_selection_keyboard,
@@ -20,13 +26,14 @@ from ..utils.keyboards import (
 )
 from ..utils.formatting import format_train_details, format_train_times_header
 from .common import (
-    get_message_context,
+    ensure_favorites,
+    get_status_context,
     clear_message_context,
     get_page_number,
     set_page_number,
     log_command,
     log_callback,
-    get_station_objects_by_ids
+    get_station_by_id
 )
 
 async def start_status_flow(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -34,10 +41,10 @@ async def start_status_flow(update: Update, context: ContextTypes.DEFAULT_TYPE)
     query = update.callback_query
     
     # Initialize status data with message-specific context
-    status_context = get_message_context(update, context, "status")
+    status_context = get_status_context(update, context)
     
     # Show status options
-    keyboard = create_status_action_keyboard()
+    keyboard = STATUS_ACTION_KEYBOARD
     await query.edit_message_text(
         "What would you like to check?", 
         reply_markup=keyboard
@@ -50,9 +57,9 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     log_command(update, "status")
     
     # Initialize status data with message-specific context
-    status_context = get_message_context(update, context, "status")
+    status_context = get_status_context(update, context)
     
-    keyboard = create_status_action_keyboard()
+    keyboard = STATUS_ACTION_KEYBOARD
     await update.message.reply_text(
         "What would you like to check?", reply_markup=keyboard
     )
@@ -65,8 +72,8 @@ async def check_train_status(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await query.answer()
     
     # Store the status type
-    status_context = get_message_context(update, context, "status")
-    status_context["type"] = "future" if query.data == f"{CallbackPrefix.STATUS}_future" else "current"
+    status_context = get_status_context(update, context)
+    status_context.type = "future" if query.data == STATUS_FUTURE else "current"
     
     # Show departure station selection
     return await select_status_departure_station(update, context)
@@ -74,19 +81,12 @@ async def check_train_status(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def select_status_departure_station(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Show departure station selection for status check."""
     # Get user's favorite stations
-    user = update.effective_user
-    user_id = await get_or_create_user(
-        user.id, user.username, user.first_name, user.last_name, user.language_code
-    )
-    favorite_station_ids = await get_user_favorite_stations(user_id)
-    
-    # Convert station IDs to station objects
-    favorite_stations = get_station_objects_by_ids(favorite_station_ids)
+    favorite_stations = await ensure_favorites(update, context)
     
     # Create keyboard with favorite stations
     keyboard = create_station_keyboard(
         favorite_stations, 
-        f"{CallbackPrefix.STATUS}_dep"
+        STATUS_DEP
     )
     
     # Send or edit message
@@ -109,12 +109,14 @@ async def show_status_all_stations(update: Update, context: ContextTypes.DEFAULT
     # Get current page
     page = get_page_number(update, context)
     
+    # Exclude the departure station once one is chosen
+    departure_station = get_status_context(update, context).departure_station
+    
     # Create keyboard
     keyboard = create_paginated_stations_keyboard(
         page,
         prefix,
-        exclude_station_id=get_message_context(update, context, "status")
-        .get("departure_station", {}).get("id")
+        exclude_station_id=departure_station["id"] if departure_station else None
     )
     
     # Update message
@@ -124,7 +126,7 @@ async def show_status_all_stations(update: Update, context: ContextTypes.DEFAULT
     )
     
     # Return appropriate state
-    return (ConversationState.SELECT_DEPARTURE if prefix == f"{CallbackPrefix.STATUS}_dep"
+    return (ConversationState.SELECT_DEPARTURE if prefix == STATUS_DEP
             else ConversationState.SELECT_ARRIVAL)
 
 async def handle_status_pagination(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -133,10 +135,9 @@ async def handle_status_pagination(update: Update, context: ContextTypes.DEFAULT
     await query.answer()
     
     # Extract page number and prefix from callback data
-    # Format: status_page_<prefix>_<page_number>
-    parts = query.data.split("_")
-    page = int(parts[-1])
-    prefix = "_".join(parts[2:-1])  # Skip "status" and "page", take everything until the last part
+    match = STATUS_PAGE_RE.match(query.data)
+    page = int(match["page"])
+    prefix = match["prefix"]
     
     # Store the new page
     set_page_number(update, context, page)
@@ -149,43 +150,35 @@ async def select_status_arrival_station(update: Update, context: ContextTypes.DE
     query = update.callback_query
     await query.answer()
     
-    status_context = get_message_context(update, context, "status")
+    status_context = get_status_context(update, context)
     
     # Handle show all stations request
-    if query.data == f"show_all_{CallbackPrefix.STATUS}_dep":
+    if query.data == SHOW_ALL_STATUS_DEP:
         set_page_number(update, context, 0)
-        return await show_status_all_stations(update, context, f"{CallbackPrefix.STATUS}_dep")
+        return await show_status_all_stations(update, context, STATUS_DEP)
     
     # Extract the station ID and store departure station
-    if query.data.startswith(f"{CallbackPrefix.STATUS}_dep_"):
-        station_id = query.data.split("_")[-1]
-        for station in TRAIN_STATIONS:
-            if station["id"] == station_id:
-                status_context["departure_station"] = {
-                    "id": station["id"],
-                    "name": station["english"]
-                }
-                break
+    if query.data.startswith(STATUS_DEP_PREFIX):
+        station_id = query.data.rpartition("_")[2]
+        station = get_station_by_id(station_id)
+        if station:
+            status_context.departure_station = {
+                "id": station["id"],
+                "name": station["english"]
+            }
     
     # Get user's favorite stations
-    user = update.effective_user
-    user_id = await get_or_create_user(
-        user.id, user.username, user.first_name, user.last_name, user.language_code
-    )
-    favorite_station_ids = await get_user_favorite_stations(user_id)
-    
-    # Convert station IDs to station objects
-    favorite_stations = get_station_objects_by_ids(favorite_station_ids)
+    favorite_stations = await ensure_favorites(update, context)
     
     # Create keyboard
     keyboard = create_station_keyboard(
         favorite_stations,
-        f"{CallbackPrefix.STATUS}_arr",
-        exclude_station_id=status_context["departure_station"]["id"]
+        STATUS_ARR,
+        exclude_station_id=status_context.departure_station["id"]
     )
     
     await query.edit_message_text(
-        f"Selected departure: {status_context['departure_station']['name']}\n"
+        f"Selected departure: {status_context.departure_station['name']}\n"
         f"Please select your arrival station:",
         reply_markup=keyboard
     )
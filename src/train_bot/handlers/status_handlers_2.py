@@ -1,64 +1,167 @@
 """Additional status command handlers for the train bot."""
 
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timedelta
 import logging
+from types import MappingProxyType
+from typing import List, Optional, Tuple
 
 # Configure logger
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
+from cachetools import TTLCache
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 import telegram.error
 
 import train_facade
-from train_stations import TRAIN_STATIONS
-from ..utils.constants import ConversationState, CallbackPrefix
+from ..utils.constants import (
+    ConversationState,
+    STATUS_ARR,
+    STATUS_ARR_PREFIX,
+    STATUS_DATE_PREFIX,
+    STATUS_BACK_TO_TIMES,
+    SHOW_ALL_STATUS_ARR,
+    DAY_NAMES,
+    PY_WEEKDAY_TO_DAY_OF_WEEK
+)
 from ..utils.keyboards import (
     create_date_selection_keyboard,
     create_train_times_keyboard,
     create_train_details_keyboard
 )
 from ..utils.formatting import format_train_details, format_train_times_header
+from ..utils.date_utils import parse_iso, format_long_date
+from ..utils.api_cache import (
+    cached_get_delay,
+    cached_get_train_times,
+    cached_get_timetable,
+    TrainTimetable
+)
 from .common import (
-    get_message_context,
+    StatusContext,
+    get_status_context,
     clear_message_context,
-    log_callback
+    log_callback,
+    answer_callback_query,
+    get_station_by_id
 )
 from .status import show_status_all_stations
 
+# Train lists shown in status flows, keyed by the train_times_key kept in the status context.
+# Keeps the lists out of user_data; an evicted list is rebuilt from the key.
+train_list_cache = TTLCache(maxsize=4096, ttl=600)
+# Rendered (train list, header, keyboard) per train list key, reused when navigating back
+train_list_render_cache = TTLCache(maxsize=4096, ttl=600)
+# Day of week entries for status contexts, indexed by day of week (0=Sunday); read-only, copied when stored
+_DAY_OF_WEEK_INFO = tuple(
+    MappingProxyType({"value": day_of_week, "name": name}) for day_of_week, name in enumerate(DAY_NAMES)
+)
+# Rendered train details per route, train, live status and minute of the last update time
+train_details_render_cache = TTLCache(maxsize=4096, ttl=60)
+
+def _filter_current_trains(timetable: TrainTimetable, now_minutes: int) -> List[Tuple[str, str, int]]:
+    """Keep trains that are running or departing within 2 hours of now_minutes."""
+    departure_minutes = timetable.departure_minutes
+    arrival_minutes = timetable.arrival_minutes
+    
+    # With departures in order, only trains departing between the longest trip ago
+    # and 2 hours from now can qualify, so binary search for that slice
+    if timetable.departures_sorted:
+        candidates = range(
+            bisect_left(departure_minutes, now_minutes - timetable.max_duration),
+            bisect_right(departure_minutes, now_minutes + 120)
+        )
+    else:
+        candidates = range(len(timetable))
+    
+    relevant_indices = []
+    for i in candidates:
+        departure = departure_minutes[i]
+        # Include if currently running or departing within 2 hours
+        if departure <= now_minutes <= arrival_minutes[i] or 0 < departure - now_minutes <= 120:
+            relevant_indices.append(i)
+    
+    # Only the selected trains are materialized as tuples
+    return [timetable.row(i) for i in relevant_indices]
+
+async def get_train_list(status_context: StatusContext) -> List[Tuple[str, str, int]]:
+    """Get the train list shown in a status flow, rebuilding it if it was evicted."""
+    key = status_context.train_times_key
+    if key is None:
+        return []
+    
+    train_times = train_list_cache.get(key)
+    if train_times is None:
+        _, departure_id, arrival_id, day_of_week, _, now_minutes = key
+        if now_minutes is None:
+            train_times = await cached_get_train_times(departure_id, arrival_id, day_of_week)
+        else:
+            train_times = _filter_current_trains(
+                await cached_get_timetable(departure_id, arrival_id, day_of_week),
+                now_minutes
+            )
+        train_list_cache[key] = train_times
+    return train_times
+
+def _train_list_key(update: Update, status_context: StatusContext, now_minutes: Optional[int] = None) -> Tuple:
+    """Build the cache key for the train list a status flow is about to show."""
+    return (
+        update.effective_user.id,
+        status_context.departure_station["id"],
+        status_context.arrival_station["id"],
+        status_context.day_of_week["value"],
+        status_context.date_raw,
+        now_minutes
+    )
+
+def _store_train_list(status_context: StatusContext, key: Tuple, train_times: List[Tuple]) -> None:
+    """Cache a status flow's train list and keep only its key in the status context."""
+    train_list_cache[key] = train_times
+    status_context.train_times_key = key
+
+async def _show_cached_train_list(query, status_context: StatusContext, key: Tuple) -> bool:
+    """Show a train list rendered earlier for the same key; returns False if there is none."""
+    rendered = train_list_render_cache.get(key)
+    if rendered is None:
+        return False
+    
+    train_times, header, keyboard = rendered
+    _store_train_list(status_context, key, train_times)
+    await query.edit_message_text(header, reply_markup=keyboard)
+    return True
+
 async def select_status_date(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Show date selection for future train status."""
     query = update.callback_query
     await query.answer()
     
-    status_context = get_message_context(update, context, "status")
+    status_context = get_status_context(update, context)
     
     # Handle show all stations request
-    if query.data == f"show_all_{CallbackPrefix.STATUS}_arr":
-        return await show_status_all_stations(update, context, f"{CallbackPrefix.STATUS}_arr")
+    if query.data == SHOW_ALL_STATUS_ARR:
+        return await show_status_all_stations(update, context, STATUS_ARR)
     
     # Extract the station ID and store arrival station
-    if query.data.startswith(f"{CallbackPrefix.STATUS}_arr_"):
-        station_id = query.data.split("_")[-1]
-        for station in TRAIN_STATIONS:
-            if station["id"] == station_id:
-                status_context["arrival_station"] = {
-                    "id": station["id"],
-                    "name": station["english"]
-                }
-                break
+    if query.data.startswith(STATUS_ARR_PREFIX):
+        station_id = query.data.rpartition("_")[2]
+        station = get_station_by_id(station_id)
+        if station:
+            status_context.arrival_station = {
+                "id": station["id"],
+                "name": station["english"]
+            }
     
     # If this is a current train status check, get the times now
-    if status_context["type"] == "current":
+    if status_context.type == "current":
         return await get_current_train_status(update, context)
     
     # For future train status, show date selection
     keyboard = create_date_selection_keyboard()
     
     await query.edit_message_text(
-        f"Selected route: {status_context['departure_station']['name']} → "
-        f"{status_context['arrival_station']['name']}\n"
+        f"Selected route: {status_context.departure_station['name']} → "
+        f"{status_context.arrival_station['name']}\n"
         f"Please select the date:",
         reply_markup=keyboard
     )
@@ -70,58 +173,59 @@ async def get_future_train_status(update: Update, context: ContextTypes.DEFAULT_
     query = update.callback_query
     await query.answer()
     
-    status_context = get_message_context(update, context, "status")
+    status_context = get_status_context(update, context)
     
     # Extract the date from the callback data
-    if query.data.startswith(f"{CallbackPrefix.STATUS}_date_"):
-        date_str = query.data.split("_")[-1]
+    if query.data.startswith(STATUS_DATE_PREFIX):
+        date_str = query.data.rpartition("_")[2]
         date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
         
-        # Store the selected date
-        status_context["date"] = {
-            "raw": date_str,
-            "formatted": date_obj.strftime("%A, %B %d, %Y")
-        }
+        # Store the selected date, keeping the parsed object for later views
+        status_context.date_raw = date_str
+        status_context.date_obj = date_obj
+        status_context.date_formatted = format_long_date(date_obj)
+    else:
+        date_obj = status_context.date_obj
     
     # Get the day of week (0=Sunday, 6=Saturday)
-    day_of_week = date_obj.weekday()
-    # Adjust for Sunday=0 in our system vs Monday=0 in Python's
-    day_of_week = (day_of_week + 1) % 7
+    day_of_week = PY_WEEKDAY_TO_DAY_OF_WEEK[date_obj.weekday()]
     
-    # Add day of week to the context with a human-readable name
-    day_names = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
-    status_context["date"]["day_of_week"] = {
-        "value": day_of_week,
-        "name": day_names[day_of_week]
-    }
+    # Add day of week to the context with a human-readable name, as a plain dict user_data can hold
+    status_context.day_of_week = dict(_DAY_OF_WEEK_INFO[day_of_week])
     
     try:
+        # Reuse the rendered list if this route and date were shown recently
+        key = _train_list_key(update, status_context)
+        if await _show_cached_train_list(query, status_context, key):
+            return ConversationState.SELECT_TIME
+        
         # Get train times
-        train_times = train_facade.get_train_times(
-            status_context["departure_station"]["id"],
-            status_context["arrival_station"]["id"],
+        train_times = await cached_get_train_times(
+            status_context.departure_station["id"],
+            status_context.arrival_station["id"],
             day_of_week
         )
         
         if not train_times:
             await query.edit_message_text(
-                f"No trains found for this route on {status_context['date']['formatted']}.\n"
+                f"No trains found for this route on {status_context.date_formatted}.\n"
                 f"Please try a different date or route."
             )
             return ConversationHandler.END
         
         # Store train times
-        status_context["train_times"] = train_times
+        _store_train_list(status_context, key, train_times)
         
         # Create keyboard
         keyboard = create_train_times_keyboard(train_times)
         
         # Create header
         header = format_train_times_header(
-            status_context["departure_station"],
-            status_context["arrival_station"],
+            status_context.departure_station,
+            status_context.arrival_station,
             date=date_obj
         )
+        train_list_render_cache[key] = (train_times, header, keyboard)
         
         await query.edit_message_text(header, reply_markup=keyboard)
         return ConversationState.SELECT_TIME
@@ -137,38 +241,38 @@ async def get_current_train_status(update: Update, context: ContextTypes.DEFAULT
     query = update.callback_query
     await query.answer()
     
-    status_context = get_message_context(update, context, "status")
+    status_context = get_status_context(update, context)
     
     # Get current time
     now = datetime.now()
     
-    # Get the day of week
-    day_of_week = (now.weekday() + 1) % 7  # Adjust for Sunday=0
+    # Get the day of week (0=Sunday, 6=Saturday)
+    day_of_week = PY_WEEKDAY_TO_DAY_OF_WEEK[now.weekday()]
     
-    # Add day of week to the context with a human-readable name
-    day_names = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
     # Make sure the date object exists
-    if "date" not in status_context:
-        status_context["date"] = {
-            "raw": now.strftime("%Y-%m-%d"),
-            "formatted": now.strftime("%A, %B %d, %Y")
-        }
+    if status_context.date_raw is None:
+        status_context.date_raw = now.strftime("%Y-%m-%d")
+        status_context.date_obj = now.date()
+        status_context.date_formatted = format_long_date(now)
     
-    # Add day of week information
-    status_context["date"]["day_of_week"] = {
-        "value": day_of_week,
-        "name": day_names[day_of_week]
-    }
+    # Add day of week to the context with a human-readable name, as a plain dict user_data can hold
+    status_context.day_of_week = dict(_DAY_OF_WEEK_INFO[day_of_week])
     
     try:
+        # Reuse the rendered list if this route was shown in the same minute
+        now_minutes = now.hour * 60 + now.minute
+        key = _train_list_key(update, status_context, now_minutes)
+        if await _show_cached_train_list(query, status_context, key):
+            return ConversationState.SELECT_TIME
+        
         # Get train times
-        train_times = train_facade.get_train_times(
-            status_context["departure_station"]["id"],
-            status_context["arrival_station"]["id"],
+        timetable = await cached_get_timetable(
+            status_context.departure_station["id"],
+            status_context.arrival_station["id"],
             day_of_week
         )
         
-        if not train_times:
+        if not timetable:
             await query.edit_message_text(
                 f"No trains found for this route today.\n"
                 f"Please try a different route."
@@ -176,19 +280,7 @@ async def get_current_train_status(update: Update, context: ContextTypes.DEFAULT
             return ConversationHandler.END
         
         # Filter for current and upcoming trains
-        current_time = now.time()
-        relevant_trains = []
-        
-        for departure_time, arrival_time, switches in train_times:
-            departure_dt = datetime.fromisoformat(departure_time)
-            arrival_dt = datetime.fromisoformat(arrival_time)
-            
-            # Include if currently running or departing within 2 hours
-            if (departure_dt.time() <= current_time <= arrival_dt.time() or
-                (departure_dt.time() > current_time and 
-                 (datetime.combine(now.date(), departure_dt.time()) - 
-                  datetime.combine(now.date(), current_time)).seconds / 3600 <= 2)):
-                relevant_trains.append((departure_time, arrival_time, switches))
+        relevant_trains = _filter_current_trains(timetable, now_minutes)
         
         if not relevant_trains:
             await query.edit_message_text(
@@ -198,17 +290,18 @@ async def get_current_train_status(update: Update, context: ContextTypes.DEFAULT
             return ConversationHandler.END
         
         # Store train times
-        status_context["train_times"] = relevant_trains
+        _store_train_list(status_context, key, relevant_trains)
         
         # Create keyboard
         keyboard = create_train_times_keyboard(relevant_trains, current_time=now)
         
         # Create header
         header = format_train_times_header(
-            status_context["departure_station"],
-            status_context["arrival_station"],
+            status_context.departure_station,
+            status_context.arrival_station,
             current_time=now
         )
+        train_list_render_cache[key] = (relevant_trains, header, keyboard)
         
         await query.edit_message_text(header, reply_markup=keyboard)
         return ConversationState.SELECT_TIME
@@ -222,105 +315,116 @@ async def get_current_train_status(update: Update, context: ContextTypes.DEFAULT
 async def show_train_details(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Show details for the selected train."""
     query = update.callback_query
-    await query.answer()
+    # A refresh was already answered by refresh_train_status
+    if "selected_train_index" not in context.user_data:
+        await query.answer()
     
     user = update.effective_user
-    logger.info(f"User {user.id} ({user.username}) requested train details with callback data: {query.data}")
+    logger.info("User %s (%s) requested train details with callback data: %s", user.id, user.username, query.data)
     
-    status_context = get_message_context(update, context, "status")
-    logger.debug(f"Status context in show_train_details: {status_context}")
+    status_context = get_status_context(update, context)
+    logger.debug("Status context in show_train_details: %s", status_context)
     
     try:
         # Handle back to train list request
-        if query.data == f"{CallbackPrefix.STATUS}_back_to_times":
+        if query.data == STATUS_BACK_TO_TIMES:
             logger.debug("Going back to train times list")
-            if status_context["type"] == "future":
+            if status_context.type == "future":
                 return await get_future_train_status(update, context)
             else:
                 return await get_current_train_status(update, context)
         
         # First check if there's a stored train index from refresh
         train_index = context.user_data.pop("selected_train_index", None)
+        refreshing = train_index is not None
         
         # If not, extract from callback data
         if train_index is None:
-            train_index = int(query.data.split("_")[-1])
+            train_index = int(query.data.rpartition("_")[2])
             
-        logger.debug(f"Using train_index in show_train_details: {train_index}")
+        logger.debug("Using train_index in show_train_details: %s", train_index)
         
         # Get train details
-        train_times = status_context.get("train_times", [])
-        logger.debug(f"Train times available: {len(train_times)} trains")
+        train_times = await get_train_list(status_context)
+        logger.debug("Train times available: %s trains", len(train_times))
         
         if train_index >= len(train_times):
-            logger.error(f"Invalid train index: {train_index}, only {len(train_times)} trains available")
+            logger.error("Invalid train index: %s, only %s trains available", train_index, len(train_times))
             await query.edit_message_text("Invalid train selection. Please try again.")
             return ConversationHandler.END
         
         departure_time, arrival_time, switches = train_times[train_index]
-        logger.debug(f"Showing details for train: {departure_time} -> {arrival_time} with {switches} switches")
+        logger.debug("Showing details for train: %s -> %s with %s switches", departure_time, arrival_time, switches)
         
         # Get current time and format times
         now = datetime.now()
-        departure_dt = datetime.fromisoformat(departure_time)
-        arrival_dt = datetime.fromisoformat(arrival_time)
-        
+        departure_dt = parse_iso(departure_time)
+        arrival_dt = parse_iso(arrival_time)
+        selected_date = status_context.date_obj
+        
+        # Without live status the details are shown without delay information
+        delay_minutes = None
+        switch_stations = None
+        note = ""
         try:
             # Get train status
-            logger.debug(f"Fetching train status from API for departure: {departure_time}")
-            logger.debug(f"Departure station: {status_context['departure_station']['id']}, Arrival station: {status_context['arrival_station']['id']}")
+            logger.debug("Fetching train status from API for departure: %s", departure_time)
+            logger.debug("Departure station: %s, Arrival station: %s", status_context.departure_station['id'], status_context.arrival_station['id'])
             
-            train_status = train_facade.get_delay_from_api(
-                status_context["departure_station"]["id"],
-                status_context["arrival_station"]["id"],
+            train_status = await cached_get_delay(
+                status_context.departure_station["id"],
+                status_context.arrival_station["id"],
                 departure_time
             )
-            logger.debug(f"API returned delay of {train_status.delay_in_minutes} minutes")
-            
-            # Format message
-            message = format_train_details(
-                status_context["departure_station"],
-                status_context["arrival_station"],
-                departure_dt,
-                arrival_dt,
-                switches,
-                delay_minutes=train_status.delay_in_minutes,
-                switch_stations=train_status.switch_stations,
-                date=datetime.strptime(status_context["date"]["raw"], "%Y-%m-%d") if "date" in status_context else None,
-                last_updated=now
-            )
-            
+            logger.debug("API returned delay of %s minutes", train_status.delay_in_minutes)
+            delay_minutes = train_status.delay_in_minutes
+            switch_stations = train_status.switch_stations
         except train_facade.TrainNotFoundError as tnf:
-            logger.warning(f"Train not found in API: {str(tnf)}")
-            # Format message without status
-            message = format_train_details(
-                status_context["departure_station"],
-                status_context["arrival_station"],
-                departure_dt,
-                arrival_dt,
-                switches,
-                date=datetime.strptime(status_context["date"]["raw"], "%Y-%m-%d") if "date" in status_context else None,
-                last_updated=now
-            )
+            logger.warning("Train not found in API: %s", tnf)
         except Exception as api_error:
-            logger.error(f"Error getting train status from API: {str(api_error)}", exc_info=api_error)
-            # Format message without status but mention the error
+            logger.error("Error getting train status from API: %s", api_error, exc_info=api_error)
+            note = "\n\nNote: Could not retrieve current delay information due to an API error."
+        
+        # Format message, reusing the rendering if nothing it shows has changed
+        render_key = (
+            status_context.departure_station["id"],
+            status_context.arrival_station["id"],
+            departure_time,
+            arrival_time,
+            switches,
+            delay_minutes,
+            tuple(switch_stations) if switch_stations else None,
+            selected_date,
+            now.hour * 60 + now.minute,
+            note
+        )
+        message = train_details_render_cache.get(render_key)
+        if message is None:
             message = format_train_details(
-                status_context["departure_station"],
-                status_context["arrival_station"],
+                status_context.departure_station,
+                status_context.arrival_station,
                 departure_dt,
                 arrival_dt,
                 switches,
-                date=datetime.strptime(status_context["date"]["raw"], "%Y-%m-%d") if "date" in status_context else None,
+                delay_minutes=delay_minutes,
+                switch_stations=switch_stations,
+                date=selected_date,
                 last_updated=now
+            ) + note
+            
+            # Add subscription note
+            message += (
+                "\n\nTo receive automatic updates about this train, use the /subscribe command "
+                "to set up a subscription for your regular trains."
             )
-            message += f"\n\nNote: Could not retrieve current delay information due to an API error."
+            train_details_render_cache[render_key] = message
         
-        # Add subscription note
-        message += (
-            "\n\nTo receive automatic updates about this train, use the /subscribe command "
-            "to set up a subscription for your regular trains."
-        )
+        # On refresh, skip the edit if this message already shows the same text and keyboard
+        # (the keyboard only depends on the train index)
+        details_hash = hash((train_index, message))
+        if refreshing and status_context.details_hash == details_hash:
+            logger.info("Message content unchanged, skipping edit")
+            return ConversationState.SELECT_TIME
         
         # Create keyboard
         keyboard = create_train_details_keyboard(
@@ -332,11 +436,12 @@ async def show_train_details(update: Update, context: ContextTypes.DEFAULT_TYPE)
         logger.debug("Sending train details to user")
         try:
             await query.edit_message_text(message, reply_markup=keyboard)
+            status_context.details_hash = details_hash
         except telegram.error.BadRequest as e:
             # Handle case when content hasn't changed (common during refresh)
             if "Message is not modified" in str(e):
-                logger.info("Message content unchanged, sending notification")
-                await query.answer("No changes to train status", show_alert=True)
+                logger.info("Message content unchanged, skipping edit")
+                status_context.details_hash = details_hash
             else:
                 # Re-raise if it's a different BadRequest error
                 raise
@@ -344,7 +449,7 @@ async def show_train_details(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return ConversationState.SELECT_TIME
         
     except Exception as e:
-        logger.error(f"Error showing train details: {str(e)}", exc_info=e)
+        logger.error("Error showing train details: %s", e, exc_info=e)
         await query.edit_message_text(
             f"Sorry, there was an error showing the train details: {str(e)}. Please try again."
         )
@@ -353,33 +458,35 @@ async def show_train_details(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def refresh_train_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Refresh the train status."""
     query = update.callback_query
-    await query.answer()
+    # Answer before fetching so the client stops its loading spinner; errors are shown in the message
+    await answer_callback_query(update)
     
     user = update.effective_user
-    logger.info(f"User {user.id} ({user.username}) clicked refresh button with callback data: {query.data}")
+    logger.info("User %s (%s) clicked refresh button with callback data: %s", user.id, user.username, query.data)
     
     try:
         # Extract train index
-        train_index = int(query.data.split("_")[-1])
-        logger.debug(f"Extracted train_index: {train_index}")
+        train_index = int(query.data.rpartition("_")[2])
+        logger.debug("Extracted train_index: %s", train_index)
         
-        status_context = get_message_context(update, context, "status")
-        logger.debug(f"Status context: {status_context}")
+        status_context = get_status_context(update, context)
+        logger.debug("Status context: %s", status_context)
         
         # Log train details before refreshing
-        if "train_times" in status_context and train_index < len(status_context["train_times"]):
-            departure_time, arrival_time, switches = status_context["train_times"][train_index]
-            logger.debug(f"Refreshing train: {departure_time} -> {arrival_time} with {switches} switches")
+        train_times = train_list_cache.get(status_context.train_times_key, ())
+        if train_index < len(train_times):
+            departure_time, arrival_time, switches = train_times[train_index]
+            logger.debug("Refreshing train: %s -> %s with %s switches", departure_time, arrival_time, switches)
         
         # Store train index in context instead of modifying query.data
         context.user_data["selected_train_index"] = train_index
-        logger.debug(f"Stored train_index {train_index} in context.user_data")
+        logger.debug("Stored train_index %s in context.user_data", train_index)
         
         # Show updated details
         return await show_train_details(update, context)
         
     except Exception as e:
-        logger.error(f"Error refreshing train status: {str(e)}", exc_info=e)
+        logger.error("Error refreshing train status: %s", e, exc_info=e)
         await query.edit_message_text(
             f"Sorry, there was an error refreshing the train status: {str(e)}. Please try again."
         )
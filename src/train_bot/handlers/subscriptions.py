@@ -2,25 +2,28 @@
 
 from datetime import datetime
 
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 
 from ..database.operations import (
-    get_or_create_user,
     create_subscription,
     cancel_subscription,
-    get_user_subscriptions
+    invalidate_user_subscriptions
 )
-from ..utils.constants import ConversationState, CallbackPrefix
+from ..utils.constants import ConversationState
 from ..utils.keyboards import (
     create_station_keyboard,
     create_paginated_stations_keyboard,
-    create_subscription_confirmation_keyboard,
-    create_main_menu_keyboard,
-    add_back_to_menu_button
+    SUBSCRIPTION_CONFIRMATION_KEYBOARD,
+    SUBSCRIPTIONS_KEYBOARD,
+    SUBSCRIPTIONS_COMMAND_KEYBOARD,
+    BACK_TO_MENU_KEYBOARD,
+    MAIN_MENU_BUTTON_KEYBOARD
 )
 from ..utils.formatting import format_subscriptions_list, format_subscription_details
 from .common import (
+    resolve_user_id,
+    get_active_subscriptions,
     get_message_context,
     clear_message_context,
     get_page_number,
@@ -34,21 +37,13 @@ async def show_subscriptions(update: Update, context: ContextTypes.DEFAULT_TYPE)
     query = update.callback_query
     
     # Get user's subscriptions
-    user = update.effective_user
-    user_id = await get_or_create_user(
-        user.id, user.username, user.first_name, user.last_name, user.language_code
-    )
-    subscriptions = await get_user_subscriptions(user_id)
+    subscriptions = await get_active_subscriptions(update, context)
     
     # Format message
     message = format_subscriptions_list(subscriptions)
     
     # Create keyboard with return to menu
-    keyboard_buttons = []
-    if subscriptions:
-        keyboard_buttons.append([InlineKeyboardButton("Cancel Subscription", callback_data=f"{CallbackPrefix.MENU}_unsub")])
-    keyboard_buttons = add_back_to_menu_button(keyboard_buttons)
-    keyboard = InlineKeyboardMarkup(keyboard_buttons)
+    keyboard = SUBSCRIPTIONS_KEYBOARD if subscriptions else BACK_TO_MENU_KEYBOARD
     
     await query.edit_message_text(message, reply_markup=keyboard)
     return ConversationState.MAIN_MENU
@@ -58,21 +53,13 @@ async def subscriptions_command(update: Update, context: ContextTypes.DEFAULT_TY
     log_command(update, "mysubscriptions")
     
     # Get user's subscriptions
-    user = update.effective_user
-    user_id = await get_or_create_user(
-        user.id, user.username, user.first_name, user.last_name, user.language_code
-    )
-    subscriptions = await get_user_subscriptions(user_id)
+    subscriptions = await get_active_subscriptions(update, context)
     
     # Format message
     message = format_subscriptions_list(subscriptions)
     
     # Create keyboard with return to menu
-    keyboard_buttons = []
-    if subscriptions:
-        keyboard_buttons.append([InlineKeyboardButton("Cancel Subscription", callback_data=f"{CallbackPrefix.MENU}_unsub")])
-    keyboard_buttons.append([InlineKeyboardButton("Main Menu", callback_data=f"{CallbackPrefix.MENU}_main")])
-    keyboard = InlineKeyboardMarkup(keyboard_buttons)
+    keyboard = SUBSCRIPTIONS_COMMAND_KEYBOARD if subscriptions else MAIN_MENU_BUTTON_KEYBOARD
     
     await update.message.reply_text(message, reply_markup=keyboard)
     return ConversationState.MAIN_MENU
@@ -82,17 +69,11 @@ async def start_unsubscribe_flow(update: Update, context: ContextTypes.DEFAULT_T
     query = update.callback_query
     
     # Get user's subscriptions
-    user = update.effective_user
-    user_id = await get_or_create_user(
-        user.id, user.username, user.first_name, user.last_name, user.language_code
-    )
-    subscriptions = await get_user_subscriptions(user_id)
+    subscriptions = await get_active_subscriptions(update, context)
     
     if not subscriptions:
         # No subscriptions, show message with return to menu
-        keyboard_buttons = []
-        keyboard_buttons = add_back_to_menu_button(keyboard_buttons)
-        keyboard = InlineKeyboardMarkup(keyboard_buttons)
+        keyboard = BACK_TO_MENU_KEYBOARD
         
         await query.edit_message_text(
             "You don't have any active subscriptions.\n\n"
@@ -102,7 +83,7 @@ async def start_unsubscribe_flow(update: Update, context: ContextTypes.DEFAULT_T
         return ConversationState.MAIN_MENU
     
     # Create subscription selection keyboard
-    keyboard = create_subscription_confirmation_keyboard()
+    keyboard = SUBSCRIPTION_CONFIRMATION_KEYBOARD
     
     # Show subscription list with cancel options
     message = format_subscriptions_list(subscriptions) + "\n\nPlease select a subscription to cancel:"
@@ -114,17 +95,11 @@ async def unsubscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     log_command(update, "unsubscribe")
     
     # Get user's subscriptions
-    user = update.effective_user
-    user_id = await get_or_create_user(
-        user.id, user.username, user.first_name, user.last_name, user.language_code
-    )
-    subscriptions = await get_user_subscriptions(user_id)
+    subscriptions = await get_active_subscriptions(update, context)
     
     if not subscriptions:
         # No subscriptions, show message with return to menu
-        keyboard_buttons = []
-        keyboard_buttons.append([InlineKeyboardButton("Main Menu", callback_data=f"{CallbackPrefix.MENU}_main")])
-        keyboard = InlineKeyboardMarkup(keyboard_buttons)
+        keyboard = MAIN_MENU_BUTTON_KEYBOARD
         
         await update.message.reply_text(
             "You don't have any active subscriptions.\n\n"
@@ -135,7 +110,7 @@ async def unsubscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     # Format message and create keyboard
     message = format_subscriptions_list(subscriptions)
-    keyboard = create_subscription_confirmation_keyboard()
+    keyboard = SUBSCRIPTION_CONFIRMATION_KEYBOARD
     
     # Show subscription list with cancel options
     await update.message.reply_text(
@@ -151,10 +126,11 @@ async def handle_subscription_selection(update: Update, context: ContextTypes.DE
     await query.answer()
     
     # Extract subscription ID
-    subscription_id = int(query.data.split("_")[-1])
+    subscription_id = int(query.data.rpartition("_")[2])
     
     # Cancel subscription
     if await cancel_subscription(subscription_id):
+        invalidate_user_subscriptions(await resolve_user_id(update, context))
         await query.edit_message_text(
             "✅ Subscription cancelled successfully.\n\n"
             "Use /subscribe to set up a new subscription."
@@ -174,10 +150,7 @@ async def handle_subscription_confirmation(update: Update, context: ContextTypes
     if query.data == "confirm_yes":
         # Get subscription details
         subscription_context = get_message_context(update, context, "subscription")
-        user = update.effective_user
-        user_id = await get_or_create_user(
-            user.id, user.username, user.first_name, user.last_name, user.language_code
-        )
+        user_id = await resolve_user_id(update, context)
         
         # Create subscription
         # Extract day_of_week value if it's a dictionary
@@ -0,0 +1,49 @@
+"""Logging configuration shared by the bot and poller entry points."""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+from typing import Optional
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Environment variable holding the log level name, e.g. LOG_LEVEL=DEBUG
+LOG_LEVEL_ENV = "LOG_LEVEL"
+
+# Background thread writing queued log records
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def _stop_listener() -> None:
+    """Write out queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def configure_logging(level: Optional[int] = None) -> None:
+    """Configure the root logger once for the whole process."""
+    global _listener
+    if level is None:
+        # LOG_LEVEL may be set in the .env file, so load it first
+        from load_env import load_env_once
+        load_env_once()
+        level = getattr(logging, os.environ.get(LOG_LEVEL_ENV, "INFO").upper(), logging.INFO)
+
+    _stop_listener()
+
+    # Loggers only enqueue records; a listener thread formats and writes them,
+    # so logging never blocks the event loop on stream I/O
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    # The queue handler only merges the message and traceback; the stream handler adds the rest
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(level=level, handlers=[queue_handler], force=True)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+
+atexit.register(_stop_listener)
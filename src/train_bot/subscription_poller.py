@@ -20,22 +20,19 @@ import asyncio
 import telegram
 from telegram.error import TelegramError
 from telegram.ext import ApplicationBuilder
+from telegram.request import HTTPXRequest
 
 import train_facade
 from train_stations import TRAIN_STATIONS
-from src.train_bot.utils.date_utils import WEEKDAYS, next_weekday
+from src.train_bot.utils.constants import PY_WEEKDAY_TO_DAY_OF_WEEK
 from src.train_bot.utils.formatting import format_train_details
-from src.train_bot.utils.keyboards import create_train_details_keyboard
+from src.train_bot.utils.keyboards import create_train_details_keyboard, create_notification_refresh_keyboard
+from src.train_bot.logging_setup import configure_logging
+from src.train_bot.database.models import apply_pragmas
 from load_env import init_env
 
-# Configure logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO
-)
 # Set our loggers to DEBUG level, but keep library loggers at INFO
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
 # Database path
 DB_PATH = "train_bot.db"
@@ -49,33 +46,90 @@ TELEGRAM_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "")
 # Global bot instance
 _bot = None
 
+# Maximum concurrent train API requests while polling
+MAX_CONCURRENT_API_REQUESTS = 10
+_api_semaphore = None
+
+# Maximum concurrent Telegram sends while polling, matching the bot's connection pool;
+# sends beyond it wait on the semaphore rather than timing out on the pool
+MAX_CONCURRENT_SENDS = 10
+_send_semaphore = None
+
+# Hours before departure a subscribed train's status is checked
+HOURS_BEFORE_DEPARTURE = 1
+
+# Last status stored for subscriptions outside the check window
+IDLE_STATUS_JSON = json.dumps({"status": "unknown", "delay_minutes": 0})
+
+# Active subscriptions of users with notifications on that check_subscription would act on:
+# trains departing within the check window today or after midnight, and trains still to
+# depart whose last status must be reset to IDLE_STATUS_JSON. Times are compared as the
+# HH:MM:SS part of the stored ISO departure time.
+POLL_SUBSCRIPTIONS_QUERY = """
+SELECT 
+    s.subscription_id, s.user_id, u.telegram_id, 
+    s.departure_station, s.arrival_station, 
+    s.day_of_week, s.departure_time, s.last_status,
+    u.notification_before_departure, u.notification_delay_threshold
+FROM subscriptions s
+JOIN users u ON s.user_id = u.user_id
+WHERE s.active = 1 AND s.day_of_week IN (:today, :tomorrow) AND u.notifications_paused = 0
+AND (
+    (s.day_of_week = :today AND substr(s.departure_time, 12, 8) >= :now
+     AND (substr(s.departure_time, 12, 8) <= :today_horizon
+          OR s.last_status IS NULL OR s.last_status != :idle_status))
+    OR (s.day_of_week = :tomorrow
+     AND (substr(s.departure_time, 12, 8) <= :tomorrow_horizon
+          OR s.last_status IS NULL OR s.last_status != :idle_status))
+)
+"""
+
+INSERT_NOTIFICATION_QUERY = "INSERT INTO notifications (subscription_id, notification_type, message) VALUES (?, ?, ?)"
+
+def get_api_semaphore():
+    """Get the semaphore bounding concurrent train API requests, created in the running event loop."""
+    global _api_semaphore
+    if _api_semaphore is None:
+        _api_semaphore = asyncio.Semaphore(MAX_CONCURRENT_API_REQUESTS)
+    return _api_semaphore
+
+def get_send_semaphore():
+    """Get the semaphore bounding concurrent Telegram sends, created in the running event loop."""
+    global _send_semaphore
+    if _send_semaphore is None:
+        _send_semaphore = asyncio.Semaphore(MAX_CONCURRENT_SENDS)
+    return _send_semaphore
+
 # Initialize bot in async context
 async def get_bot():
     """Get a shared instance of the Telegram bot."""
     global _bot
     if _bot is None:
-        # Initialize with default connection pool settings for v20+
-        # which has better defaults than the previous versions
         if not TELEGRAM_TOKEN:
             logger.error("No Telegram token available")
             raise ValueError("TELEGRAM_BOT_TOKEN environment variable not set")
-        _bot = telegram.Bot(token=TELEGRAM_TOKEN)
+        _bot = telegram.Bot(
+            token=TELEGRAM_TOKEN,
+            # One connection per concurrent send; the default pool holds a single connection
+            request=HTTPXRequest(connection_pool_size=MAX_CONCURRENT_SENDS, pool_timeout=30.0)
+        )
     return _bot
 
 logger.info("Starting bot")
 
+# Station ID -> English name index
+_STATION_NAME_BY_ID = {station["id"]: station["english"] for station in TRAIN_STATIONS}
+
 def get_station_name(station_id):
     """Get the English name of a station by its ID."""
-    for station in TRAIN_STATIONS:
-        if station["id"] == station_id:
-            return station["english"]
-    return "Unknown Station"
+    return _STATION_NAME_BY_ID.get(station_id, "Unknown Station")
 
 
 async def check_subscription(subscription_id, user_id, telegram_id, departure_station, 
                            arrival_station, day_of_week, departure_time, 
                            last_status_json, notification_before_departure, 
-                           notification_delay_threshold, hours_before_departure=1):
+                           notification_delay_threshold, hours_before_departure=1,
+                           notification_log=None):
     """
     Check a single subscription for status changes and send notifications if needed.
     
@@ -90,6 +144,8 @@ async def check_subscription(subscription_id, user_id, telegram_id, departure_st
         last_status_json: JSON string of the last known status
         notification_before_departure: Minutes before departure to notify
         notification_delay_threshold: Minimum delay minutes to trigger notification
+        notification_log: Optional list collecting (subscription_id, type, message) rows
+            of sent notifications for the caller to store; stored right away if omitted
     
     Returns:
         tuple: (updated_status_json, notifications_sent)
@@ -98,29 +154,30 @@ async def check_subscription(subscription_id, user_id, telegram_id, departure_st
         # Parse the departure time
         departure_dt = datetime.fromisoformat(departure_time)
         
-        # Get the current day of week
-        current_day = datetime.now().weekday()
-        # Adjust for Sunday=0 in our system vs Monday=0 in Python's
-        current_day = (current_day + 1) % 7
+        # Read the clock once so the day and departure checks agree
+        now = datetime.now()
+        
+        # Get the current day of week (Sunday=0 in our system vs Monday=0 in Python's)
+        current_day = PY_WEEKDAY_TO_DAY_OF_WEEK[now.weekday()]
         
         # Check if this is the subscription's day or the day before
         is_subscription_day = current_day == day_of_week
         is_day_before = (current_day + 1) % 7 == day_of_week
         
         # Add detailed logging for day check
-        logger.debug(f"Subscription {subscription_id}: Current day={current_day}, Subscription day={day_of_week}")
-        logger.debug(f"Subscription {subscription_id}: Is subscription day: {is_subscription_day}, Is day before: {is_day_before}")
+        logger.debug("Subscription %s: Current day=%s, Subscription day=%s", subscription_id, current_day, day_of_week)
+        logger.debug("Subscription %s: Is subscription day: %s, Is day before: %s", subscription_id, is_subscription_day, is_day_before)
         
         # If it's not the subscription day or the day before, no need to check
         if not (is_subscription_day or is_day_before):
-            logger.debug(f"Subscription {subscription_id}: Skipping check - not subscription day or day before")
+            logger.debug("Subscription %s: Skipping check - not subscription day or day before", subscription_id)
             return last_status_json, 0
         
         # Get the next occurrence of this train
         if is_subscription_day:
-            train_date = datetime.now().date()
+            train_date = now.date()
         else:  # is_day_before
-            train_date = (datetime.now() + timedelta(days=1)).date()
+            train_date = (now + timedelta(days=1)).date()
         
         # Combine date and time
         train_datetime = datetime.combine(
@@ -129,14 +186,14 @@ async def check_subscription(subscription_id, user_id, telegram_id, departure_st
         )
         
         # If the train has already departed today, no need to check
-        if is_subscription_day and train_datetime < datetime.now():
-            logger.debug(f"Subscription {subscription_id}: Train already departed today - skipping check")
+        if is_subscription_day and train_datetime < now:
+            logger.debug("Subscription %s: Train already departed today - skipping check", subscription_id)
             return last_status_json, 0
         
         # Time until departure
-        time_until_departure = train_datetime - datetime.now()
+        time_until_departure = train_datetime - now
         hours_until_departure = time_until_departure.total_seconds() / 3600
-        logger.debug(f"Subscription {subscription_id}: Train datetime: {train_datetime}, Hours until departure: {hours_until_departure:.2f}")
+        logger.debug("Subscription %s: Train datetime: %s, Hours until departure: %.2f", subscription_id, train_datetime, hours_until_departure)
         
         # Parse the last status
         try:
@@ -149,7 +206,7 @@ async def check_subscription(subscription_id, user_id, telegram_id, departure_st
         current_status = {"status": "unknown", "delay_minutes": 0}
         
         # Only check status if within specified hours of departure
-        logger.debug(f"Subscription {subscription_id}: Checking if {hours_until_departure:.2f} hours ≤ {hours_before_departure} hours (hours_before_departure)")
+        logger.debug("Subscription %s: Checking if %.2f hours ≤ %s hours (hours_before_departure)", subscription_id, hours_until_departure, hours_before_departure)
         if hours_until_departure <= hours_before_departure:
             # Initialize api_time_format outside the try block so it's always defined
             # This fixes the "api_time_format is possibly unbound" error in the exception handler
@@ -157,11 +214,15 @@ async def check_subscription(subscription_id, user_id, telegram_id, departure_st
             
             try:
                 logger.info("Checking updates for subscription %s for train on %s", subscription_id, train_datetime)
-                logger.debug(f"Subscription {subscription_id}: Calling API for {get_station_name(departure_station)} → {get_station_name(arrival_station)} at {api_time_format}")
-                # Get train status from facade
-                train_times = train_facade.get_delay_from_api(
-                    departure_station, arrival_station, api_time_format
-                )
+                # Only look up station names when the debug line is emitted
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Subscription %s: Calling API for %s → %s at %s", subscription_id, get_station_name(departure_station), get_station_name(arrival_station), api_time_format)
+                # Get train status from facade in a worker thread so other checks keep running
+                async with get_api_semaphore():
+                    train_times = await asyncio.to_thread(
+                        train_facade.get_delay_from_api,
+                        departure_station, arrival_station, api_time_format
+                    )
                 
                 # Update current status
                 current_status = {
@@ -179,11 +240,11 @@ async def check_subscription(subscription_id, user_id, telegram_id, departure_st
                 was_notified_of_delay = last_status.get("status") == "delayed" and "last_notification_sent_at" in last_status
 
                 # Log notification decision details
-                logger.debug(f"Subscription {subscription_id}: Status type changed: {status_type_changed}")
-                logger.debug(f"Subscription {subscription_id}: Delay minutes changed: {delay_minutes_changed}")
-                logger.debug(f"Subscription {subscription_id}: Train is delayed: {train_is_delayed}")
-                logger.debug(f"Subscription {subscription_id}: Was previously notified of delay: {was_notified_of_delay}")
-                logger.debug(f"Subscription {subscription_id}: Current delay: {current_status['delay_minutes']} min, threshold: {notification_delay_threshold} min")
+                logger.debug("Subscription %s: Status type changed: %s", subscription_id, status_type_changed)
+                logger.debug("Subscription %s: Delay minutes changed: %s", subscription_id, delay_minutes_changed)
+                logger.debug("Subscription %s: Train is delayed: %s", subscription_id, train_is_delayed)
+                logger.debug("Subscription %s: Was previously notified of delay: %s", subscription_id, was_notified_of_delay)
+                logger.debug("Subscription %s: Current delay: %s min, threshold: %s min", subscription_id, current_status['delay_minutes'], notification_delay_threshold)
                 
                 # Determine if we should send a notification
                 should_send_notification = False
@@ -206,16 +267,16 @@ async def check_subscription(subscription_id, user_id, telegram_id, departure_st
                             logger.info("Subscription %s: Initial delay notification of %s minutes", 
                                        subscription_id, current_status["delay_minutes"])
                         else:
-                            logger.debug(f"Subscription {subscription_id}: Not sending notification - delay of {current_status['delay_minutes']} min is below threshold of {notification_delay_threshold} min")
+                            logger.debug("Subscription %s: Not sending notification - delay of %s min is below threshold of %s min", subscription_id, current_status['delay_minutes'], notification_delay_threshold)
                 else:
                     # For non-delayed trains, use the threshold
                     delay_change = abs(last_status.get("delay_minutes", 0) - current_status["delay_minutes"])
-                    logger.debug(f"Subscription {subscription_id}: Delay change is {delay_change} min")
+                    logger.debug("Subscription %s: Delay change is %s min", subscription_id, delay_change)
                     should_send_notification = delay_change >= notification_delay_threshold
                     if should_send_notification:
                         logger.info("Subscription %s: Non-delayed train status changed significantly", subscription_id)
                     else:
-                        logger.debug(f"Subscription {subscription_id}: Not sending notification - delay change of {delay_change} min is below threshold")
+                        logger.debug("Subscription %s: Not sending notification - delay change of %s min is below threshold", subscription_id, delay_change)
 
                 logger.info("Subscription %s prevStatus: %s currStatus: %s shouldNotify: %s", 
                            subscription_id, last_status.get("status"), current_status["status"], should_send_notification)
@@ -259,32 +320,28 @@ async def check_subscription(subscription_id, user_id, telegram_id, departure_st
                         "To manage your subscriptions, use the /subscriptions command."
                     )
                     
-                    # Create a callback data string with subscription ID which contains all needed info
-                    callback_data = f"refresh_notif_{subscription_id}"
-                    
                     # Create keyboard with the subscription-specific refresh callback
-                    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-                    keyboard = InlineKeyboardMarkup([
-                        [InlineKeyboardButton("🔄 Refresh", callback_data=callback_data)]
-                    ])
+                    keyboard = create_notification_refresh_keyboard(subscription_id)
                     
                     # Send the message with keyboard
                     bot = await get_bot()
 
-                    await bot.send_message(
-                        chat_id=telegram_id, 
-                        text=message,
-                        reply_markup=keyboard
-                    )
+                    async with get_send_semaphore():
+                        await bot.send_message(
+                            chat_id=telegram_id, 
+                            text=message,
+                            reply_markup=keyboard
+                        )
                     notifications_sent += 1
                     
                     # Log the notification
-                    async with aiosqlite.connect(DB_PATH) as conn:
-                        await conn.execute(
-                            "INSERT INTO notifications (subscription_id, notification_type, message) VALUES (?, ?, ?)",
-                            (subscription_id, "status_change", message)
-                        )
-                        await conn.commit()
+                    notification = (subscription_id, "status_change", message)
+                    if notification_log is not None:
+                        notification_log.append(notification)
+                    else:
+                        async with aiosqlite.connect(DB_PATH) as conn:
+                            await conn.execute(INSERT_NOTIFICATION_QUERY, notification)
+                            await conn.commit()
                 # Check if we need to send a departure reminder
                 minutes_until_departure = time_until_departure.total_seconds() / 60
                 should_send_reminder = (
@@ -293,21 +350,21 @@ async def check_subscription(subscription_id, user_id, telegram_id, departure_st
                 )
                 
             except train_facade.TrainNotFoundError:
-                logger.warning(f"Train not found for subscription {subscription_id} from {get_station_name(departure_station)} to {get_station_name(arrival_station)} at {api_time_format}")
+                logger.warning("Train not found for subscription %s from %s to %s at %s", subscription_id, get_station_name(departure_station), get_station_name(arrival_station), api_time_format)
                 current_status = {"status": "not_found", "delay_minutes": 0}
             except Exception as e:
-                logger.error(f"Error checking train status for subscription {subscription_id}: {e}")
+                logger.error("Error checking train status for subscription %s: %s", subscription_id, e)
                 # Keep the last status in case of error
                 current_status = last_status
         
         else:
-            logger.debug(f"Subscription {subscription_id}: Skipping status check - train departs in {hours_until_departure:.2f} hours which is > {hours_before_departure} hours threshold")
+            logger.debug("Subscription %s: Skipping status check - train departs in %.2f hours which is > %s hours threshold", subscription_id, hours_until_departure, hours_before_departure)
             
         # Return the updated status
         return json.dumps(current_status), notifications_sent
         
     except Exception as e:
-        logger.error(f"Error in check_subscription for {subscription_id}: {e}")
+        logger.error("Error in check_subscription for %s: %s", subscription_id, e)
         return last_status_json, 0
 
 
@@ -317,55 +374,66 @@ async def poll_subscriptions():
     try:
         # Connect to database
         conn = await aiosqlite.connect(DB_PATH)
-        # Get all active subscriptions with user info, excluding users with paused notifications
-        async with conn.execute("""
-        SELECT 
-            s.subscription_id, s.user_id, u.telegram_id, 
-            s.departure_station, s.arrival_station, 
-            s.day_of_week, s.departure_time, s.last_status,
-            u.notification_before_departure, u.notification_delay_threshold
-        FROM subscriptions s
-        JOIN users u ON s.user_id = u.user_id
-        WHERE s.active = 1 AND u.notifications_paused = 0
-        """) as cursor:
+        await apply_pragmas(conn)
+        # Only subscriptions for today or tomorrow departing within the check window can be due;
+        # the window runs into tomorrow when it crosses midnight
+        now = datetime.now()
+        horizon = now + timedelta(hours=HOURS_BEFORE_DEPARTURE)
+        crosses_midnight = horizon.date() != now.date()
+        current_day = PY_WEEKDAY_TO_DAY_OF_WEEK[now.weekday()]
+        params = {
+            "today": current_day,
+            "tomorrow": (current_day + 1) % 7,
+            "now": now.strftime("%H:%M:%S"),
+            "today_horizon": "24:00:00" if crosses_midnight else horizon.strftime("%H:%M:%S"),
+            # No time of day sorts before an empty string
+            "tomorrow_horizon": horizon.strftime("%H:%M:%S") if crosses_midnight else "",
+            "idle_status": IDLE_STATUS_JSON
+        }
+        
+        # Get those active subscriptions with user info, excluding users with paused notifications
+        async with conn.execute(POLL_SUBSCRIPTIONS_QUERY, params) as cursor:
             subscriptions = list(await cursor.fetchall())
-            logger.info(f"Checking {len(subscriptions)} active subscriptions (excluding paused users)")
+        logger.info("Checking %s due subscriptions (excluding paused users)", len(subscriptions))
             
-            total_notifications = 0
+        # Check all subscriptions concurrently; each row matches check_subscription's arguments
+        notification_log = []
+        results = await asyncio.gather(
+            *(check_subscription(*subscription, hours_before_departure=HOURS_BEFORE_DEPARTURE,
+                                 notification_log=notification_log)
+              for subscription in subscriptions),
+            return_exceptions=True
+        )
+        
+        total_notifications = 0
+        status_updates = []
+        checked_at = datetime.now().isoformat()
+        for subscription, result in zip(subscriptions, results):
+            subscription_id = subscription[0]
+            if isinstance(result, BaseException):
+                logger.error("Error checking subscription %s: %s", subscription_id, result)
+                continue
             
-            # Check each subscription
-            for subscription in subscriptions:
-                (
-                    subscription_id, user_id, telegram_id, 
-                    departure_station, arrival_station, 
-                    day_of_week, departure_time, last_status,
-                    notification_before_departure, notification_delay_threshold
-                ) = subscription
-                
-                # Check this subscription
-                updated_status, notifications_sent = await check_subscription(
-                    subscription_id, user_id, telegram_id, 
-                    departure_station, arrival_station, 
-                    day_of_week, departure_time, last_status,
-                    notification_before_departure, notification_delay_threshold
-                )
-                
-                total_notifications += notifications_sent
-                
-                # Update the last status and check time
-                await conn.execute(
-                    """
-                    UPDATE subscriptions 
-                    SET last_status = ?, last_checked = ? 
-                    WHERE subscription_id = ?
-                    """,
-                    (updated_status, datetime.now().isoformat(), subscription_id)
-                )
-                await conn.commit()
-            logger.info(f"Polling complete. Sent {total_notifications} notifications.")
+            updated_status, notifications_sent = result
+            total_notifications += notifications_sent
+            status_updates.append((updated_status, checked_at, subscription_id))
+        
+        # Store sent notifications and update the last status and check time of all
+        # subscriptions in one transaction
+        await conn.executemany(INSERT_NOTIFICATION_QUERY, notification_log)
+        await conn.executemany(
+            """
+            UPDATE subscriptions 
+            SET last_status = ?, last_checked = ? 
+            WHERE subscription_id = ?
+            """,
+            status_updates
+        )
+        await conn.commit()
+        logger.info("Polling complete. Sent %s notifications.", total_notifications)
     
     except Exception as e:
-        logger.error(f"Error in poll_subscriptions: {e}")
+        logger.error("Error in poll_subscriptions: %s", e)
     finally:
         if conn is not None:
             await conn.close()
@@ -385,7 +453,7 @@ async def main():
         
         # Check if the database exists
         if not os.path.exists(DB_PATH):
-            logger.error(f"Database file {DB_PATH} not found")
+            logger.error("Database file %s not found", DB_PATH)
             return
         
         # Check if the bot token is set
@@ -397,8 +465,9 @@ async def main():
         await poll_subscriptions()
         
     except Exception as e:
-        logger.error(f"Error in main: {e}")
+        logger.error("Error in main: %s", e)
 
 
 if __name__ == "__main__":
+    configure_logging()
     asyncio.run(main())
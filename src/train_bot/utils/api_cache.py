@@ -0,0 +1,177 @@
+"""Short-lived caches in front of the train API calls made by the handlers."""
+
+import asyncio
+import logging
+from array import array
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple, Union
+
+from cachetools import TLRUCache, TTLCache
+
+import train_facade
+from .date_utils import parse_iso
+from ..database.timetable_store import (
+    load_timetable,
+    save_timetable,
+    load_frequent_timetables,
+    prune_timetables
+)
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Seconds to keep live delay information
+DELAY_TTL = 30
+# Seconds to keep a route's timetable for a day
+TRAIN_TIMES_TTL = 3600
+
+# Seconds since train times loaded from the store were fetched from the API, by cache key
+_stored_ages: Dict[Hashable, float] = {}
+
+def _train_times_ttu(key: Hashable, value: Any, now: float) -> float:
+    """Expire train times TRAIN_TIMES_TTL seconds after they were fetched from the API, even if loaded from the store."""
+    return now + TRAIN_TIMES_TTL - _stored_ages.pop(key, 0)
+
+delay_cache = TTLCache(maxsize=4096, ttl=DELAY_TTL)
+train_times_cache = TLRUCache(maxsize=4096, ttu=_train_times_ttu)
+# Column-wise timetables with parsed minutes, keyed like train_times_cache
+timetable_cache = TTLCache(maxsize=4096, ttl=TRAIN_TIMES_TTL)
+
+# Maximum concurrent requests to the train API
+MAX_CONCURRENT_REQUESTS = 8
+_api_semaphore = None
+
+# In-flight fetches per cache key, so concurrent callers share one upstream request
+_fetch_locks: Dict[Hashable, asyncio.Lock] = {}
+
+def get_api_semaphore() -> asyncio.Semaphore:
+    """Get the semaphore bounding concurrent train API requests, created in the running event loop."""
+    global _api_semaphore
+    if _api_semaphore is None:
+        _api_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    return _api_semaphore
+
+async def aget_delay_from_api(*args) -> "train_facade.TrainTimes":
+    """Run train_facade.get_delay_from_api in a worker thread so it doesn't block the event loop."""
+    async with get_api_semaphore():
+        return await asyncio.to_thread(train_facade.get_delay_from_api, *args)
+
+async def aget_train_times(*args) -> List[Tuple[str, str, int]]:
+    """Run train_facade.get_train_times in a worker thread so it doesn't block the event loop."""
+    async with get_api_semaphore():
+        return await asyncio.to_thread(train_facade.get_train_times, *args)
+
+async def _get_or_fetch(cache: Union[TTLCache, TLRUCache], key: Tuple, fetch: Callable[..., Awaitable[Any]], *args) -> Any:
+    """Return the cached value for key, fetching it once if several callers miss together."""
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock = _fetch_locks.setdefault(key, asyncio.Lock())
+    try:
+        async with lock:
+            # Another caller may have filled the cache while we waited
+            value = cache.get(key)
+            if value is None:
+                value = await fetch(*args)
+                cache[key] = value
+            return value
+    finally:
+        if _fetch_locks.get(key) is lock:
+            del _fetch_locks[key]
+
+async def cached_get_delay(departure_station: str, arrival_station: str, departure_time: str) -> "train_facade.TrainTimes":
+    """Get a train's live status, reusing a result fetched in the last DELAY_TTL seconds."""
+    key = ("delay", departure_station, arrival_station, departure_time)
+    return await _get_or_fetch(
+        delay_cache, key, aget_delay_from_api,
+        departure_station, arrival_station, departure_time
+    )
+
+def _train_times_key(departure_station: str, arrival_station: str, day_of_week: int, today: date) -> Tuple:
+    """Build the train_times_cache key for a route's train times on a day of week."""
+    # The day of week resolves to a date relative to today, so include today in the key
+    return ("train_times", departure_station, arrival_station, day_of_week, today)
+
+async def _fetch_train_times_tuple(departure_station: str, arrival_station: str,
+                                   day_of_week: int, today: date) -> Tuple[Tuple[str, str, int], ...]:
+    """Fetch train times as a tuple, so the cached value can be shared safely between callers."""
+    # Train times stored within the TTL survive restarts; only fetch routes not stored yet
+    fetched_for = today.isoformat()
+    stored = await load_timetable(departure_station, arrival_station, day_of_week, fetched_for, TRAIN_TIMES_TTL)
+    if stored is not None:
+        train_times, age = stored
+        _stored_ages[_train_times_key(departure_station, arrival_station, day_of_week, today)] = age
+        return train_times
+    
+    train_times = tuple(
+        tuple(train) for train in await aget_train_times(departure_station, arrival_station, day_of_week)
+    )
+    await save_timetable(departure_station, arrival_station, day_of_week, fetched_for, train_times)
+    return train_times
+
+async def cached_get_train_times(departure_station: str, arrival_station: str,
+                                 day_of_week: int) -> Tuple[Tuple[str, str, int], ...]:
+    """Get a route's train times for a day of week, reusing a result fetched in the last TRAIN_TIMES_TTL seconds."""
+    today = date.today()
+    key = _train_times_key(departure_station, arrival_station, day_of_week, today)
+    return await _get_or_fetch(
+        train_times_cache, key, _fetch_train_times_tuple,
+        departure_station, arrival_station, day_of_week, today
+    )
+
+async def warm_train_times_cache() -> None:
+    """Drop stored train times from earlier days and load today's most requested routes into memory."""
+    today = date.today()
+    fetched_for = today.isoformat()
+    await prune_timetables(fetched_for)
+    
+    stored = await load_frequent_timetables(fetched_for, TRAIN_TIMES_TTL)
+    for departure_station, arrival_station, day_of_week, train_times, age in stored:
+        key = _train_times_key(departure_station, arrival_station, day_of_week, today)
+        # Keep the stored row's age, so it expires when the fetched train times would have
+        _stored_ages[key] = age
+        train_times_cache[key] = train_times
+    logger.info("Loaded %s stored timetables", len(stored))
+
+def _minutes_since_midnight(iso_time: str) -> int:
+    """Convert an ISO timestamp to minutes since midnight."""
+    parsed = parse_iso(iso_time)
+    return parsed.hour * 60 + parsed.minute
+
+class TrainTimetable:
+    """A route's train times stored column-wise, with departure and arrival minutes since midnight parsed once."""
+
+    def __init__(self, train_times: Tuple[Tuple[str, str, int], ...]):
+        self.train_times = train_times
+        self.departure_iso = tuple(departure_time for departure_time, _, _ in train_times)
+        self.arrival_iso = tuple(arrival_time for _, arrival_time, _ in train_times)
+        self.switches = array('B', (switches for _, _, switches in train_times))
+        self.departure_minutes = array('H', map(_minutes_since_midnight, self.departure_iso))
+        self.arrival_minutes = array('H', map(_minutes_since_midnight, self.arrival_iso))
+        # Whether departures are in ascending order, so scans can stop early
+        self.departures_sorted = all(a <= b for a, b in zip(self.departure_minutes, self.departure_minutes[1:]))
+        # Longest same-day trip, bounding how early a still-running train can have departed
+        self.max_duration = max(
+            (arrival - departure for departure, arrival in zip(self.departure_minutes, self.arrival_minutes)
+             if arrival >= departure),
+            default=0
+        )
+
+    def __len__(self) -> int:
+        return len(self.departure_iso)
+
+    def row(self, index: int) -> Tuple[str, str, int]:
+        """Get one train as a (departure_time, arrival_time, switches) tuple."""
+        return self.departure_iso[index], self.arrival_iso[index], self.switches[index]
+
+async def cached_get_timetable(departure_station: str, arrival_station: str, day_of_week: int) -> TrainTimetable:
+    """Get a route's train times for a day of week as a column-wise timetable, parsed once per fetch."""
+    train_times = await cached_get_train_times(departure_station, arrival_station, day_of_week)
+    key = (departure_station, arrival_station, day_of_week, date.today())
+    
+    # Rebuild only if the underlying train times were refetched
+    timetable = timetable_cache.get(key)
+    if timetable is None or timetable.train_times is not train_times:
+        timetable = timetable_cache[key] = TrainTimetable(train_times)
+    return timetable
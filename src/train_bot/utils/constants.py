@@ -1,9 +1,9 @@
 """Constants used throughout the train bot."""
 
-from enum import IntEnum
+import re
 
-# Conversation states
-class ConversationState(IntEnum):
+# Conversation states, plain ints so handlers return them without enum member lookups
+class ConversationState:
     SELECT_ACTION = 0
     SELECT_DEPARTURE = 1
     SELECT_ARRIVAL = 2
@@ -59,6 +59,42 @@ class CallbackPrefix:
     BACK = "back"
     MENU = "menu"  # New prefix for menu actions
 
+# Status flow callback data, built once instead of per callback
+STATUS_DEP = f"{CallbackPrefix.STATUS}_dep"
+STATUS_ARR = f"{CallbackPrefix.STATUS}_arr"
+STATUS_DEP_PREFIX = f"{STATUS_DEP}_"
+STATUS_ARR_PREFIX = f"{STATUS_ARR}_"
+STATUS_DATE_PREFIX = f"{CallbackPrefix.STATUS}_date_"
+STATUS_FUTURE = f"{CallbackPrefix.STATUS}_future"
+STATUS_CURRENT = f"{CallbackPrefix.STATUS}_current"
+STATUS_TIME_PREFIX = f"{CallbackPrefix.STATUS}_time_"
+STATUS_BACK_TO_TIMES = f"{CallbackPrefix.STATUS}_back_to_times"
+SHOW_ALL_STATUS_DEP = f"show_all_{STATUS_DEP}"
+SHOW_ALL_STATUS_ARR = f"show_all_{STATUS_ARR}"
+# Format: status_page_<prefix>_<page_number>
+STATUS_PAGE_RE = re.compile(rf"^{CallbackPrefix.STATUS}_page_(?P<prefix>.+)_(?P<page>\d+)$")
+
+# Favorites flow callback data
+FAVORITE_ADD = f"{CallbackPrefix.FAVORITE}_add"
+FAVORITE_REMOVE = f"{CallbackPrefix.FAVORITE}_remove"
+FAVORITE_DONE = f"{CallbackPrefix.FAVORITE}_done"
+PAGE_PREFIX = f"{CallbackPrefix.PAGE}_"
+BACK_PREFIX = f"{CallbackPrefix.BACK}_"
+BACK_TO_FAVORITES_PREFIX = f"{BACK_PREFIX}to_favorites_"
+
+# Main menu callback data
+MENU_STATUS = f"{CallbackPrefix.MENU}_status"
+MENU_FAVORITES = f"{CallbackPrefix.MENU}_favorites"
+MENU_SUBS = f"{CallbackPrefix.MENU}_subs"
+MENU_UNSUB = f"{CallbackPrefix.MENU}_unsub"
+MENU_MAIN = f"{CallbackPrefix.MENU}_main"
+
+# Day names indexed by our day of week (0=Sunday)
+DAY_NAMES = ("Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday")
+
+# Our day of week (0=Sunday) indexed by Python's datetime.weekday() (0=Monday)
+PY_WEEKDAY_TO_DAY_OF_WEEK = (1, 2, 3, 4, 5, 6, 0)
+
 # Pagination settings
 STATIONS_PER_PAGE = 8
 
@@ -1,15 +1,43 @@
 import datetime
 from enum import IntEnum
+from functools import lru_cache
+
+from .constants import PY_WEEKDAY_TO_DAY_OF_WEEK
 
 
 def next_weekday(d: datetime.date, weekday: int):
-    d_weekday = d.weekday() + 1  # account for the week starting on Sunday.
+    d_weekday = PY_WEEKDAY_TO_DAY_OF_WEEK[d.weekday()]  # account for the week starting on Sunday.
     days_ahead = weekday - d_weekday
     if days_ahead < 0:  # Target day already happened this week
         days_ahead += 7
     return d + datetime.timedelta(days_ahead)
 
 
+@lru_cache(maxsize=4096)
+def parse_iso(iso_time: str) -> datetime.datetime:
+    """Parse an ISO timestamp, memoized since timetable strings recur across views and refreshes."""
+    return datetime.datetime.fromisoformat(iso_time)
+
+
+def format_hhmm(dt) -> str:
+    """Format a time as HH:MM (TIME_FORMAT) without going through strftime."""
+    return f"{dt.hour:02d}:{dt.minute:02d}"
+
+
+# Long date format used in messages, e.g. "Monday, January 01, 2024"
+LONG_DATE_FORMAT = "%A, %B %d, %Y"
+
+
+@lru_cache(maxsize=512)
+def _format_long_date(year: int, month: int, day: int) -> str:
+    return datetime.date(year, month, day).strftime(LONG_DATE_FORMAT)
+
+
+def format_long_date(d: datetime.date) -> str:
+    """Format a date (or the date part of a datetime) with LONG_DATE_FORMAT, memoized per day."""
+    return _format_long_date(d.year, d.month, d.day)
+
+
 def day_of_week_sunday_to_monday_index(original_day: int):
     return (original_day - 1) % 7
 
@@ -3,7 +3,18 @@
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 
-from .constants import StatusEmoji, TIME_FORMAT, DATETIME_FORMAT
+from .constants import StatusEmoji, DATETIME_FORMAT, DAY_NAMES
+from .date_utils import format_hhmm, format_long_date
+
+# Train details for the common on-time, direct train case; matches the general builder's output
+_ON_TIME_DIRECT_TEMPLATE = (
+    f"{StatusEmoji.TRAIN} Train Details\n\n"
+    "\nRoute: %s → %s%s\n\n"
+    f"Status: {StatusEmoji.ON_TIME} On time\n"
+    "Departure: %s\n"
+    "Arrival: %s\n"
+    "Duration: %s%s"
+)
 
 def format_train_details(
     departure_station: Dict[str, str],
@@ -18,8 +29,8 @@ def format_train_details(
 ) -> str:
     """Format train details message."""
     # Format times
-    formatted_departure = departure_time.strftime(TIME_FORMAT)
-    formatted_arrival = arrival_time.strftime(TIME_FORMAT)
+    formatted_departure = format_hhmm(departure_time)
+    formatted_arrival = format_hhmm(arrival_time)
     
     # Calculate duration
     duration = arrival_time - departure_time
@@ -27,32 +38,38 @@ def format_train_details(
     minutes, _ = divmod(remainder, 60)
     duration_str = f"{hours}h {minutes}m" if hours > 0 else f"{minutes}m"
     
-    # Build the message
-    message = [f"{StatusEmoji.TRAIN} Train Details\n"]
-    
-    # Add route
-    message.append(f"\nRoute: {departure_station['name']} → {arrival_station['name']}")
-    
-    # Add date if provided
+    # Fast path for on-time trains without changes
+    if delay_minutes is not None and delay_minutes <= 0 and switches <= 0 and not switch_stations:
+        return _ON_TIME_DIRECT_TEMPLATE % (
+            departure_station['name'],
+            arrival_station['name'],
+            f"\nDate: {format_long_date(date)}" if date else "",
+            formatted_departure,
+            formatted_arrival,
+            duration_str,
+            f"\n\nLast updated: {format_hhmm(last_updated)}" if last_updated else ""
+        )
+    
+    # Build the message, starting with the header and route
+    header = f"{StatusEmoji.TRAIN} Train Details\n\n\nRoute: {departure_station['name']} → {arrival_station['name']}"
     if date:
-        message.append(f"Date: {date.strftime('%A, %B %d, %Y')}")
-    
-    message.append("")  # Empty line
-    
-    # Add status and times
-    if delay_minutes is not None:
-        if delay_minutes > 0:
-            message.append(f"Status: {StatusEmoji.DELAYED} Delayed by {delay_minutes} minutes")
-            message.append(f"Updated departure: {formatted_departure}")
-            message.append(f"Updated arrival: {formatted_arrival}")
-        else:
-            message.append(f"Status: {StatusEmoji.ON_TIME} On time")
-            message.append(f"Departure: {formatted_departure}")
-            message.append(f"Arrival: {formatted_arrival}")
+        header = f"{header}\nDate: {format_long_date(date)}"
+    
+    # Add status and times, one block per branch
+    if delay_minutes is not None and delay_minutes > 0:
+        status = (
+            f"Status: {StatusEmoji.DELAYED} Delayed by {delay_minutes} minutes\n"
+            f"Updated departure: {formatted_departure}\n"
+            f"Updated arrival: {formatted_arrival}"
+        )
     else:
-        message.append(f"Status: {StatusEmoji.UNKNOWN} Status unknown")
-        message.append(f"Departure: {formatted_departure}")
-        message.append(f"Arrival: {formatted_arrival}")
+        status_text = f"{StatusEmoji.ON_TIME} On time" if delay_minutes is not None else f"{StatusEmoji.UNKNOWN} Status unknown"
+        status = (
+            f"Status: {status_text}\n"
+            f"Departure: {formatted_departure}\n"
+            f"Arrival: {formatted_arrival}"
+        )
+    message = [header, "", status]
     
     # Add duration
     message.append(f"Duration: {duration_str}")
@@ -67,7 +84,7 @@ def format_train_details(
     
     # Add last updated timestamp if provided
     if last_updated:
-        message.append(f"\nLast updated: {last_updated.strftime(TIME_FORMAT)}")
+        message.append(f"\nLast updated: {format_hhmm(last_updated)}")
     
     return "\n".join(message)
 
@@ -101,14 +118,11 @@ def format_subscriptions_list(subscriptions: List[Dict[str, Any]]) -> str:
     if not subscriptions:
         return "You don't have any active subscriptions."
     
-    # Day of week mapping (0 = Sunday, 6 = Saturday)
-    day_names = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
-    
     message = ["Your active subscriptions:\n"]
     
     for sub in subscriptions:
         # Get day name from numeric day_of_week
-        day_name = day_names[sub['day_of_week']]
+        day_name = DAY_NAMES[sub['day_of_week']]
         
         message.extend([
             f"\n{StatusEmoji.TRAIN} {sub['departure_station']} → {sub['arrival_station']}",
@@ -146,10 +160,10 @@ def format_train_times_header(
     message.append(f"\nRoute: {departure_station['name']} → {arrival_station['name']}")
     
     if date:
-        message.append(f"Date: {date.strftime('%A, %B %d, %Y')}")
+        message.append(f"Date: {format_long_date(date)}")
     
     if current_time:
-        message.append(f"Current time: {current_time.strftime(TIME_FORMAT)}")
+        message.append(f"Current time: {format_hhmm(current_time)}")
         message.extend([
             "\nPlease select a train time:",
             f"{StatusEmoji.RUNNING} = Currently running",
@@ -1,35 +1,57 @@
 """Keyboard creation utilities for the train bot."""
 
-from typing import List, Optional
-from datetime import datetime, timedelta
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import date, datetime, timedelta
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
-from .constants import CallbackPrefix, STATIONS_PER_PAGE, StatusEmoji
+from .constants import (
+    STATIONS_PER_PAGE,
+    StatusEmoji,
+    STATUS_FUTURE,
+    STATUS_CURRENT,
+    STATUS_TIME_PREFIX,
+    STATUS_DATE_PREFIX,
+    STATUS_BACK_TO_TIMES,
+    FAVORITE_ADD,
+    FAVORITE_REMOVE,
+    FAVORITE_DONE,
+    PAGE_PREFIX,
+    BACK_TO_FAVORITES_PREFIX,
+    MENU_STATUS,
+    MENU_FAVORITES,
+    MENU_SUBS,
+    MENU_UNSUB,
+    MENU_MAIN
+)
+from .date_utils import parse_iso, format_hhmm
 from train_stations import TRAIN_STATIONS
 
 def create_status_action_keyboard() -> InlineKeyboardMarkup:
     """Create keyboard for status action selection."""
     keyboard = [
         [
-            InlineKeyboardButton("Check Future Train", callback_data=f"{CallbackPrefix.STATUS}_future"),
-            InlineKeyboardButton("Check Current Train", callback_data=f"{CallbackPrefix.STATUS}_current"),
+            InlineKeyboardButton("Check Future Train", callback_data=STATUS_FUTURE),
+            InlineKeyboardButton("Check Current Train", callback_data=STATUS_CURRENT),
         ]
     ]
     return InlineKeyboardMarkup(keyboard)
 
+@lru_cache(maxsize=4096)
+def _station_button(prefix: str, station_id: str, english: str) -> InlineKeyboardButton:
+    """Get the button selecting one station, built once per prefix and station."""
+    return InlineKeyboardButton(english, callback_data=f"{prefix}_{station_id}")
+
 def create_station_keyboard(stations: List[dict], prefix: str, 
                           exclude_station_id: Optional[str] = None) -> InlineKeyboardMarkup:
     """Create keyboard with station buttons."""
-    keyboard = []
-    for station in stations:
-        if station["id"] != exclude_station_id:
-            keyboard.append(
-                [InlineKeyboardButton(
-                    station["english"], 
-                    callback_data=f"{prefix}_{station['id']}"
-                )]
-            )
+    keyboard = [
+        [_station_button(prefix, station["id"], station["english"])]
+        for station in stations
+        if station["id"] != exclude_station_id
+    ]
     
     # Add a button to show all stations
     keyboard.append([InlineKeyboardButton("Show All Stations", callback_data=f"show_all_{prefix}")])
@@ -39,84 +61,114 @@ def create_station_keyboard(stations: List[dict], prefix: str,
     
     return InlineKeyboardMarkup(keyboard)
 
+# All stations sorted alphabetically by English name
+_SORTED_STATIONS = tuple(sorted(TRAIN_STATIONS, key=itemgetter("english")))
+
+@lru_cache(maxsize=None)
+def _sorted_stations_excluding(station_id: str) -> Tuple[Dict[str, Any], ...]:
+    """Get the sorted stations without one station, built once per excluded station."""
+    return tuple(s for s in _SORTED_STATIONS if s["id"] != station_id)
+
+@lru_cache(maxsize=None)
+def _sorted_station_rows(prefix: str, exclude_station_id: Optional[str] = None) -> Tuple[Tuple[InlineKeyboardButton], ...]:
+    """Get one button row per sorted station, built once per prefix and excluded station."""
+    stations = _sorted_stations_excluding(exclude_station_id) if exclude_station_id else _SORTED_STATIONS
+    return tuple((_station_button(prefix, s["id"], s["english"]),) for s in stations)
+
 def create_paginated_stations_keyboard(page: int, prefix: str, 
-                                     exclude_station_id: Optional[str] = None) -> InlineKeyboardMarkup:
-    """Create paginated keyboard with all stations."""
-    # Sort stations alphabetically by English name
-    sorted_stations = sorted(TRAIN_STATIONS, key=lambda x: x["english"])
-    if exclude_station_id:
-        sorted_stations = [s for s in sorted_stations if s["id"] != exclude_station_id]
+                                     exclude_station_id: Optional[str] = None,
+                                     stations: Optional[List[Dict[str, Any]]] = None) -> InlineKeyboardMarkup:
+    """Create paginated keyboard with the given stations, or all stations sorted by name."""
+    # Station button rows, prebuilt for the full sorted list
+    if stations is not None:
+        station_rows = [
+            (_station_button(prefix, s["id"], s["english"]),)
+            for s in stations
+            if s["id"] != exclude_station_id
+        ]
+    else:
+        station_rows = _sorted_station_rows(prefix, exclude_station_id or None)
     
     # Calculate pagination
     start_idx = page * STATIONS_PER_PAGE
     end_idx = start_idx + STATIONS_PER_PAGE
-    total_pages = (len(sorted_stations) + STATIONS_PER_PAGE - 1) // STATIONS_PER_PAGE
+    total_pages = (len(station_rows) + STATIONS_PER_PAGE - 1) // STATIONS_PER_PAGE
     
     # Create station buttons
-    keyboard = []
-    for station in sorted_stations[start_idx:end_idx]:
-        keyboard.append(
-            [InlineKeyboardButton(
-                station["english"], 
-                callback_data=f"{prefix}_{station['id']}"
-            )]
-        )
+    keyboard = list(station_rows[start_idx:end_idx])
     
     # Add navigation buttons
     nav_buttons = []
     if page > 0:
-        nav_buttons.append(InlineKeyboardButton("◀️ Previous", callback_data=f"{CallbackPrefix.PAGE}_{prefix}_{page-1}"))
+        nav_buttons.append(InlineKeyboardButton("◀️ Previous", callback_data=f"{PAGE_PREFIX}{prefix}_{page-1}"))
     if page < total_pages - 1:
-        nav_buttons.append(InlineKeyboardButton("Next ▶️", callback_data=f"{CallbackPrefix.PAGE}_{prefix}_{page+1}"))
+        nav_buttons.append(InlineKeyboardButton("Next ▶️", callback_data=f"{PAGE_PREFIX}{prefix}_{page+1}"))
     
     if nav_buttons:
         keyboard.append(nav_buttons)
     
     # Add a back button
-    keyboard.append([InlineKeyboardButton("Back to Favorites", callback_data=f"{CallbackPrefix.BACK}_to_favorites_{prefix}")])
+    keyboard.append([InlineKeyboardButton("Back to Favorites", callback_data=f"{BACK_TO_FAVORITES_PREFIX}{prefix}")])
     
     return InlineKeyboardMarkup(keyboard)
 
 def create_date_selection_keyboard() -> InlineKeyboardMarkup:
     """Create keyboard for date selection."""
+    return _date_selection_keyboard(datetime.now().date())
+
+@lru_cache(maxsize=1)
+def _date_selection_keyboard(today: date) -> InlineKeyboardMarkup:
+    """Build the date selection keyboard, once per day."""
     keyboard = []
-    today = datetime.now().date()
     
     for i in range(8):  # Today + 7 days
-        date = today + timedelta(days=i)
-        date_str = date.strftime("%Y-%m-%d")
-        display_date = date.strftime("%a, %b %d")  # e.g., "Mon, Jan 01"
+        day = today + timedelta(days=i)
+        date_str = day.isoformat()
+        display_date = day.strftime("%a, %b %d")  # e.g., "Mon, Jan 01"
         
         if i == 0:
             display_date = f"Today ({display_date})"
         elif i == 1:
             display_date = f"Tomorrow ({display_date})"
         
-        keyboard.append([InlineKeyboardButton(display_date, callback_data=f"{CallbackPrefix.STATUS}_date_{date_str}")])
+        keyboard.append([InlineKeyboardButton(display_date, callback_data=f"{STATUS_DATE_PREFIX}{date_str}")])
     
     return InlineKeyboardMarkup(keyboard)
 
+def _seconds_of_day(dt) -> float:
+    """Get a time of day in seconds since midnight."""
+    return dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1_000_000
+
+@lru_cache(maxsize=4096)
+def _train_time_fields(departure_time: str, arrival_time: str) -> tuple:
+    """Get a train's formatted departure, duration and departure/arrival seconds of day, computed once per train."""
+    departure_dt = parse_iso(departure_time)
+    arrival_dt = parse_iso(arrival_time)
+    
+    # Calculate duration
+    duration = arrival_dt - departure_dt
+    hours, remainder = divmod(duration.seconds, 3600)
+    minutes, _ = divmod(remainder, 60)
+    duration_str = f"{hours}h {minutes}m" if hours > 0 else f"{minutes}m"
+    
+    return format_hhmm(departure_dt), duration_str, _seconds_of_day(departure_dt), _seconds_of_day(arrival_dt)
+
 def create_train_times_keyboard(train_times: List[tuple], current_time: Optional[datetime] = None) -> InlineKeyboardMarkup:
     """Create keyboard with train times."""
     keyboard = []
     current_row = []
+    current_seconds = _seconds_of_day(current_time) if current_time else None
     
     for i, (departure_time, arrival_time, switches) in enumerate(train_times):
-        # Format times
-        departure_dt = datetime.fromisoformat(departure_time)
-        arrival_dt = datetime.fromisoformat(arrival_time)
-        formatted_departure = departure_dt.strftime("%H:%M")
-        
-        # Calculate duration
-        duration = arrival_dt - departure_dt
-        hours, remainder = divmod(duration.seconds, 3600)
-        minutes, _ = divmod(remainder, 60)
-        duration_str = f"{hours}h {minutes}m" if hours > 0 else f"{minutes}m"
+        # Format times and duration
+        formatted_departure, duration_str, departure_seconds, arrival_seconds = _train_time_fields(
+            departure_time, arrival_time
+        )
         
         # Add status indicator for current trains
         status_indicator = ""
         if current_time:
-            is_running = departure_dt.time() <= current_time.time() <= arrival_dt.time()
+            is_running = departure_seconds <= current_seconds <= arrival_seconds
             status_indicator = f"{StatusEmoji.RUNNING if is_running else StatusEmoji.SCHEDULED} "
         
         # Create button label
@@ -125,7 +177,7 @@ def create_train_times_keyboard(train_times: List[tuple], current_time: Optional
             label += f" - {switches + 1} trains"
         
         # Add button to current row
-        current_row.append(InlineKeyboardButton(label, callback_data=f"{CallbackPrefix.STATUS}_time_{i}"))
+        current_row.append(InlineKeyboardButton(label, callback_data=f"{STATUS_TIME_PREFIX}{i}"))
         
         # If row has 3 buttons or this is the last item, add row to keyboard
         if len(current_row) == 3 or i == len(train_times) - 1:
@@ -134,6 +186,7 @@ def create_train_times_keyboard(train_times: List[tuple], current_time: Optional
     
     return InlineKeyboardMarkup(keyboard)
 
+@lru_cache(maxsize=4096)
 def create_train_details_keyboard(train_index: int, show_subscribe: bool = True, show_refresh: bool = True) -> InlineKeyboardMarkup:
     """Create keyboard for train details view."""
     keyboard = []
@@ -144,25 +197,33 @@ def create_train_details_keyboard(train_index: int, show_subscribe: bool = True,
     if show_refresh:
         keyboard.append([InlineKeyboardButton("🔄 Refresh", callback_data=f"refresh_status_{train_index}")])
     
-    keyboard.append([InlineKeyboardButton("Back to Train List", callback_data=f"{CallbackPrefix.STATUS}_back_to_times")])
+    keyboard.append([InlineKeyboardButton("Back to Train List", callback_data=STATUS_BACK_TO_TIMES)])
     
     return InlineKeyboardMarkup(keyboard)
 
 def create_main_menu_keyboard() -> InlineKeyboardMarkup:
     """Create main menu keyboard with command options."""
     keyboard = [
-        [InlineKeyboardButton("Check Train Status", callback_data=f"{CallbackPrefix.MENU}_status")],
-        [InlineKeyboardButton("Manage Favorites", callback_data=f"{CallbackPrefix.MENU}_favorites")],
-        [InlineKeyboardButton("My Subscriptions", callback_data=f"{CallbackPrefix.MENU}_subs")],
-        [InlineKeyboardButton("Unsubscribe", callback_data=f"{CallbackPrefix.MENU}_unsub")]
+        [InlineKeyboardButton("Check Train Status", callback_data=MENU_STATUS)],
+        [InlineKeyboardButton("Manage Favorites", callback_data=MENU_FAVORITES)],
+        [InlineKeyboardButton("My Subscriptions", callback_data=MENU_SUBS)],
+        [InlineKeyboardButton("Unsubscribe", callback_data=MENU_UNSUB)]
     ]
     return InlineKeyboardMarkup(keyboard)
 
 def add_back_to_menu_button(keyboard_buttons: List[List[InlineKeyboardButton]]) -> List[List[InlineKeyboardButton]]:
     """Add a back to menu button to an existing keyboard."""
-    keyboard_buttons.append([InlineKeyboardButton("« Main Menu", callback_data=f"{CallbackPrefix.MENU}_main")])
+    keyboard_buttons.append([InlineKeyboardButton("« Main Menu", callback_data=MENU_MAIN)])
     return keyboard_buttons
 
+def create_subscriptions_keyboard(show_cancel: bool, menu_label: str = "« Main Menu") -> InlineKeyboardMarkup:
+    """Create the keyboard shown under a subscriptions list."""
+    keyboard_buttons = []
+    if show_cancel:
+        keyboard_buttons.append([InlineKeyboardButton("Cancel Subscription", callback_data=MENU_UNSUB)])
+    keyboard_buttons.append([InlineKeyboardButton(menu_label, callback_data=MENU_MAIN)])
+    return InlineKeyboardMarkup(keyboard_buttons)
+
 def create_cancel_keyboard() -> InlineKeyboardMarkup:
     """Create a keyboard with cancel button."""
     keyboard = [[InlineKeyboardButton("Cancel", callback_data="cancel")]]
@@ -171,9 +232,9 @@ def create_cancel_keyboard() -> InlineKeyboardMarkup:
 def create_favorites_keyboard() -> InlineKeyboardMarkup:
     """Create keyboard for favorites management."""
     keyboard = [
-        [InlineKeyboardButton("Add Favorite", callback_data=f"{CallbackPrefix.FAVORITE}_add")],
-        [InlineKeyboardButton("Remove Favorite", callback_data=f"{CallbackPrefix.FAVORITE}_remove")],
-        [InlineKeyboardButton("Done", callback_data=f"{CallbackPrefix.FAVORITE}_done")]
+        [InlineKeyboardButton("Add Favorite", callback_data=FAVORITE_ADD)],
+        [InlineKeyboardButton("Remove Favorite", callback_data=FAVORITE_REMOVE)],
+        [InlineKeyboardButton("Done", callback_data=FAVORITE_DONE)]
     ]
     # Add back to menu button
     keyboard = add_back_to_menu_button(keyboard)
@@ -190,3 +251,19 @@ def create_subscription_confirmation_keyboard() -> InlineKeyboardMarkup:
     # Add back to menu button
     keyboard = add_back_to_menu_button(keyboard)
     return InlineKeyboardMarkup(keyboard)
+
+@lru_cache(maxsize=4096)
+def create_notification_refresh_keyboard(subscription_id: int) -> InlineKeyboardMarkup:
+    """Create the refresh keyboard attached to subscription notifications."""
+    keyboard = [[InlineKeyboardButton("🔄 Refresh", callback_data=f"refresh_notif_{subscription_id}")]]
+    return InlineKeyboardMarkup(keyboard)
+
+# Keyboards that don't depend on user state, built once (markups are immutable)
+STATUS_ACTION_KEYBOARD = create_status_action_keyboard()
+MAIN_MENU_KEYBOARD = create_main_menu_keyboard()
+FAVORITES_KEYBOARD = create_favorites_keyboard()
+SUBSCRIPTION_CONFIRMATION_KEYBOARD = create_subscription_confirmation_keyboard()
+SUBSCRIPTIONS_KEYBOARD = create_subscriptions_keyboard(show_cancel=True)
+SUBSCRIPTIONS_COMMAND_KEYBOARD = create_subscriptions_keyboard(show_cancel=True, menu_label="Main Menu")
+BACK_TO_MENU_KEYBOARD = create_subscriptions_keyboard(show_cancel=False)
+MAIN_MENU_BUTTON_KEYBOARD = create_subscriptions_keyboard(show_cancel=False, menu_label="Main Menu")
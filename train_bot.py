@@ -27,15 +27,12 @@ from telegram.ext import (
 import train_facade
 from train_stations import TRAIN_STATIONS, FAVORITE_TRAIN_STATIONS
 from src.train_bot.utils.date_utils import WEEKDAYS, next_weekday
+from src.train_bot.logging_setup import configure_logging
 from load_env import init_env
 
-# Enable logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-)
-# Set our loggers to DEBUG level, but keep library loggers at INFO
+# Enable logging; the level comes from LOG_LEVEL
+configure_logging()
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
 # Conversation states
 (
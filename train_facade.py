@@ -6,7 +6,6 @@ from cachetools import cached, TTLCache
 
 # Configure logger
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
 import dateutil
 import requests
@@ -219,8 +218,12 @@ def extract_switch_stations(trains):
     return [station_id_to_name(train['destinationStation']) for train in trains[:-1]]
 
 
+# Station ID -> English name index
+_STATION_NAME_BY_ID = {station['id']: station['english'] for station in TRAIN_STATIONS}
+
+
 def station_id_to_name(station_id, escape=True):
-    raw_name = next(filter(lambda s: s['id'] == str(station_id), TRAIN_STATIONS))['english']
+    raw_name = _STATION_NAME_BY_ID[str(station_id)]
     if escape:
         return raw_name.replace('-', '\-')
     return raw_name